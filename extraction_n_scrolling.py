@@ -1,207 +1,90 @@
-from flask import Flask, request, jsonify
-import os
-import cv2
-import base64
-import requests
-import csv
-from dotenv import load_dotenv
+from flask import Flask, request, jsonify, url_for
 
-app = Flask(__name__)
-
-# Load environment variables
-load_dotenv()
-
-# OpenAI API Key
-api_key = os.getenv('OPENAI_API_KEY')
+from frame_pipeline import (DEFAULT_PROMPT, JobQueue, ParquetResultSink, check_backend_name, check_video_url,
+                            video_source, video_location, extract_frames, read_results, write_results_csv,
+                            write_roi_results_csv)
+from frame_pipeline.api import jobs_blueprint
 
-# Constants for directories
-DOWNLOAD_DIRECTORY = 'downloads/'
-OUTPUT_FOLDER = 'frames_output/'
+app = Flask(__name__)
 
-# Function to encode the image
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+# Videos are processed by background workers (JOB_WORKERS) instead of inside the request
+jobs = JobQueue()
+app.register_blueprint(jobs_blueprint(jobs))
 
-# Function to extract text from image using OpenAI API
-def extract_text_from_image(image_path, prompt):
-    base64_image = encode_image(image_path)
+# Job: download, frame extraction, and text extraction
+def process_video_job(video_url, ocr_backend, progress, on_result, workspace):
+    # Results go to a Parquet dataset as they come instead of piling up in memory
+    with video_source(video_url) as video_path, \
+            ParquetResultSink(workspace.file("results.parquet"), on_result=on_result, workspace=workspace) as sink:
+        extract_frames(video_path, workspace.frames, DEFAULT_PROMPT, stats=progress, on_result=sink, collect=False,
+                       ocr_backend=ocr_backend, workspace=workspace)
+    print(f"Processed video: {video_url}, Frames extracted: {sink.written}")
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+    # Prepare CSV file for writing results
+    csv_file = write_results_csv(read_results(sink.path), workspace.file("image_text_results1.csv"),
+                                 ["Image_Name", "Extracted_Text"], ["image_name", "extracted_text"], workspace)
 
-    payload = {
-        "model": "gpt-4o",
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": prompt
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    }
-                ]
-            }
-        ],
-        "max_tokens": 300
+    return {
+        "message": "Video processing completed.",
+        "video_path": video_location(video_url, video_path),
+        "num_frames": sink.written,
+        "results_file": csv_file,
+        "results_parquet": sink.path
     }
 
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-    
-    if response.status_code != 200:
-        print(f"Error: {response.status_code} - {response.text}")
-        return "Error: Unable to extract text"
+# Job: scrolling text extraction per region
+def process_scrolling_text_job(video_url, channel, ocr_backend, progress, on_result, workspace):
+    with video_source(video_url) as video_path, \
+            ParquetResultSink(workspace.file("results.parquet"), on_result=on_result, workspace=workspace) as sink:
+        # Crop the ticker, headline, top band and logo and OCR each region on its own
+        extract_frames(video_path, workspace.frames, rois=channel or "default", stats=progress, on_result=sink,
+                       collect=False, ocr_backend=ocr_backend, workspace=workspace)
+    print(f"Processed video: {video_url}, Frames extracted: {sink.written}")
 
-    response_json = response.json()
-    if 'choices' not in response_json:
-        print(f"Error: Unexpected response format: {response_json}")
-        return "Error: Unexpected response format"
+    # Prepare CSV file for writing results, one column per region
+    csv_file = write_roi_results_csv(read_results(sink.path), workspace.file("scrolling_image_text_results.csv"),
+                                     workspace=workspace)
 
-    telugu_text = response_json['choices'][0]['message']['content']
-    return telugu_text
-
-# Function to download a video using yt_dlp
-def download_video_ytdlp(youtube_url):
-    import yt_dlp as youtube_dl
-    ydl_opts = {
-        'format': 'best',
-        'outtmpl': os.path.join(DOWNLOAD_DIRECTORY, '%(title)s.%(ext)s')
+    return {
+        "message": "Scrolling text video processing completed.",
+        "video_path": video_location(video_url, video_path),
+        "num_frames": sink.written,
+        "results_file": csv_file,
+        "results_parquet": sink.path
     }
-    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(youtube_url, download=True)
-        return ydl.prepare_filename(info_dict)
-
-# Function to download a video directly using requests
-def download_video_blob(blob_url):
-    import urllib.parse
-    file_name = urllib.parse.unquote(blob_url.split('/')[-1])
-    download_path = os.path.join(DOWNLOAD_DIRECTORY, file_name)
-    with requests.get(blob_url, stream=True) as r:
-        with open(download_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-    return download_path
-
-# Function to extract frames from video and save them
-def extract_frames(video_path, output_folder, prompt):
-    os.makedirs(output_folder, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print("Error: Could not open video.")
-        return
-
-    frame_count = 0
-    results = []
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        output_name = os.path.join(output_folder, f"frame_{frame_count}.jpg")
-        cv2.imwrite(output_name, frame)
-
-        # Extract text from the frame
-        extracted_text = extract_text_from_image(output_name, prompt)
-        print(f"Image: {output_name}, Extracted Text: {extracted_text}")
-
-        results.append({
-            "image_name": output_name,
-            "extracted_text": extracted_text
-        })
-
-        frame_count += 1
-
-    cap.release()
-    cv2.destroyAllWindows()
 
-    return results
-
-# Endpoint to trigger video download, frame extraction, and text extraction
+# Endpoint to trigger video download, frame extraction, and text extraction; returns a job id
 @app.route('/process_video', methods=['POST'])
 def process_video():
     data = request.get_json()
     video_url = data['video_url']  # Example: 'https://quadz.blob.core.windows.net/newpoc/stitched_video_20240627130216.mp4'
+    ocr_backend = data.get('ocr_backend')  # OCR backend name, see frame_pipeline/backends.py
     
-    if video_url.startswith('https://www.youtube.com/'):
-        video_path = download_video_ytdlp(video_url)
-    elif video_url.startswith('https://quadz.blob.core.windows.net/'):
-        video_path = download_video_blob(video_url)
-    else:
-        return jsonify({"error": "Unsupported URL format."}), 400
-
-    # General text extraction prompt
-    prompt = "Extract the text from the image?"
-
-    results = extract_frames(video_path, OUTPUT_FOLDER, prompt)
-    print(f"Processed video: {video_path}, Frames extracted: {len(results)}")
-
-    # Prepare CSV file for writing results
-    csv_file = "image_text_results1.csv"
-    csv_header = ["Image_Name", "Extracted_Text"]
+    try:
+        check_video_url(video_url)
+        check_backend_name(ocr_backend)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(csv_header)
-
-        for result in results:
-            writer.writerow([result['image_name'], result['extracted_text']])
-
-    print(f"Results saved to {csv_file}")
-
-    return jsonify({
-        "message": "Video processing completed.",
-        "video_path": video_path,
-        "num_frames": len(results),
-        "results_file": results
-    })
+    job_id = jobs.submit(process_video_job, video_url, ocr_backend)
+    return jsonify({"job_id": job_id, "status_url": url_for('jobs.job_status', job_id=job_id)}), 202
 
-# Endpoint for scrolling text extraction
+# Endpoint for scrolling text extraction; returns a job id
 @app.route('/scrolling-text', methods=['POST'])
 def process_scrolling_text():
     data = request.get_json()
     video_url = data['video_url']  # Example: 'https://quadz.blob.core.windows.net/newpoc/stitched_video_20240627130216.mp4'
+    ocr_backend = data.get('ocr_backend')  # OCR backend name, see frame_pipeline/backends.py
+    channel = data.get('channel')  # Region layout to use, see frame_pipeline/roi.py
     
-    if video_url.startswith('https://www.youtube.com/'):
-        video_path = download_video_ytdlp(video_url)
-    elif video_url.startswith('https://quadz.blob.core.windows.net/'):
-        video_path = download_video_blob(video_url)
-    else:
-        return jsonify({"error": "Unsupported URL format."}), 400
-
-    # Scrolling text extraction prompt
-    prompt = """Extract the text from the bottom of the image, middle of the image and top of the image and tv channel name?"""
-
-    results = extract_frames(video_path, OUTPUT_FOLDER, prompt)
-    print(f"Processed video: {video_path}, Frames extracted: {len(results)}")
-
-    # Prepare CSV file for writing results
-    csv_file = "scrolling_image_text_results.csv"
-    csv_header = ["Image_Name", "Extracted_Text"]
-
-    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(csv_header)
-
-        for result in results:
-            writer.writerow([result['image_name'], result['extracted_text']])
-
-    print(f"Results saved to {csv_file}")
-
-    return jsonify({
-        "message": "Scrolling text video processing completed.",
-        "video_path": video_path,
-        "num_frames": len(results),
-        "results_file": results
-    })
+    try:
+        check_video_url(video_url)
+        check_backend_name(ocr_backend)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job_id = jobs.submit(process_scrolling_text_job, video_url, channel, ocr_backend)
+    return jsonify({"job_id": job_id, "status_url": url_for('jobs.job_status', job_id=job_id)}), 202
 
 if __name__ == "__main__":
     app.run(debug=True)
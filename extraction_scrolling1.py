@@ -1,217 +1,189 @@
-from flask import Flask, request, jsonify
-import os
-import cv2
-import base64
-import requests
-import csv
-from dotenv import load_dotenv
+from flask import Flask, request, jsonify, url_for
 
-app = Flask(__name__)
-
-# Load environment variables
-load_dotenv()
-
-# OpenAI API Key
-api_key = os.getenv('OPENAI_API_KEY')
-
-# Constants for directories
-DOWNLOAD_DIRECTORY = 'downloads/'
-OUTPUT_FOLDER = 'frames_output/'
+from frame_pipeline import (DEFAULT_PROMPT, MANIFEST_NAME, Checkpoint, JobQueue, ParquetResultSink, check_backend_name,
+                            check_video_url, video_source, video_location, extract_frames, read_results,
+                            resume_extract_frames, text_ranges, write_dead_letters, write_results_csv,
+                            write_roi_results_csv)
+from frame_pipeline.api import jobs_blueprint
 
-# Function to encode the image
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+app = Flask(__name__)
 
-# Function to extract text from image using OpenAI API
-def extract_text_from_image(image_path, prompt):
-    base64_image = encode_image(image_path)
+# Videos are processed by background workers (JOB_WORKERS) instead of inside the request
+jobs = JobQueue()
+app.register_blueprint(jobs_blueprint(jobs))
+
+# Function to save the frames whose OCR failed to the job workspace, to be retried later
+# with reprocess_dead_letters; returns the fields to add to the job result
+def dead_letter_result(dead_letters, workspace):
+    if not dead_letters:
+        return {"dead_letters": 0}
+    return {"dead_letters": len(dead_letters),
+            "dead_letters_file": write_dead_letters(dead_letters, workspace.file("dead_letters.json"),
+                                                    workspace)}
+
+# Job: download, frame extraction, and text extraction. Results are flushed to a
+# Parquet dataset as they come instead of being held in memory until the end, and
+# the job's manifest is checkpointed with every flush so POST /jobs/<id>/resume
+# continues after the last frame written.
+def process_video_job(video_url, ocr_backend, progress, on_result, workspace):
+    checkpoint = Checkpoint(workspace.file(MANIFEST_NAME))
+    checkpoint.start("process_video", video_url, ocr_backend)
+    with video_source(video_url) as video_path:
+        dead_letters = []
+        results_path = resume_extract_frames(video_path, workspace.frames, checkpoint,
+                                             workspace.file("results.parquet"), progress, on_result,
+                                             prompt=DEFAULT_PROMPT, ocr_backend=ocr_backend, workspace=workspace,
+                                             dead_letters=dead_letters)
+    print(f"Processed video: {video_url}, Frames extracted: {progress['results']}")
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+    # Prepare CSV file for writing results
+    csv_file = write_results_csv(read_results(results_path), workspace.file("image_text_results.csv"),
+                                 ["Image_Name", "Extracted_Text"], ["image_name", "extracted_text"], workspace)
 
-    payload = {
-        "model": "gpt-4o",  # Use the appropriate model name
-        "messages": [
-            {
-                "role": "user",
-                "content": f"{prompt}"
-            },
-            {
-                "role": "system",
-                "content": f"data:image/jpeg;base64,{base64_image}"
-            }
-        ],
-        "max_tokens": 300
+    return {
+        "message": "Video processing completed.",
+        "video_path": video_location(video_url, video_path),
+        "num_frames": progress['results'],
+        "results_file": csv_file,
+        "results_parquet": results_path,
+        **dead_letter_result(dead_letters, workspace)
     }
 
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-    
-    if response.status_code != 200:
-        print(f"Error: {response.status_code} - {response.text}")
-        return "Error: Unable to extract text"
-
-    response_json = response.json()
-    if 'choices' not in response_json:
-        print(f"Error: Unexpected response format: {response_json}")
-        return "Error: Unexpected response format"
-
-    telugu_text = response_json['choices'][0]['message']['content']
-    return telugu_text
-
-# Function to download a video using yt_dlp
-def download_video_ytdlp(youtube_url):
-    import yt_dlp as youtube_dl
-    ydl_opts = {
-        'format': 'best',
-        'outtmpl': os.path.join(DOWNLOAD_DIRECTORY, '%(title)s.%(ext)s')
+# Job: scrolling text extraction per region
+def process_scrolling_text_job(video_url, channel, ocr_backend, progress, on_result, workspace):
+    checkpoint = Checkpoint(workspace.file(MANIFEST_NAME))
+    checkpoint.start("scrolling_text", video_url, channel, ocr_backend)
+    with video_source(video_url) as video_path:
+        # Crop the ticker, headline, top band and logo and OCR each region on its own
+        dead_letters = []
+        results_path = resume_extract_frames(video_path, workspace.frames, checkpoint,
+                                             workspace.file("results.parquet"), progress, on_result,
+                                             rois=channel or "default", ocr_backend=ocr_backend, workspace=workspace,
+                                             dead_letters=dead_letters)
+    print(f"Processed video: {video_url}, Frames extracted: {progress['results']}")
+
+    # Prepare CSV file for writing results, one column per region
+    csv_file = write_roi_results_csv(read_results(results_path), workspace.file("scrolling_image_text_results.csv"),
+                                     workspace=workspace)
+
+    return {
+        "message": "Scrolling text video processing completed.",
+        "video_path": video_location(video_url, video_path),
+        "num_frames": progress['results'],
+        "results_file": csv_file,
+        "results_parquet": results_path,
+        **dead_letter_result(dead_letters, workspace)
     }
-    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(youtube_url, download=True)
-        return ydl.prepare_filename(info_dict)
-
-# Function to download a video directly using requests
-def download_video_blob(blob_url):
-    import urllib.parse
-    file_name = urllib.parse.unquote(blob_url.split('/')[-1])
-    download_path = os.path.join(DOWNLOAD_DIRECTORY, file_name)
-    with requests.get(blob_url, stream=True) as r:
-        with open(download_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-    return download_path
-
-# Function to extract frames from video and save them
-def extract_frames(video_path, output_folder, prompt):
-    os.makedirs(output_folder, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print("Error: Could not open video.")
-        return []
-
-    frame_count = 0
-    results = []
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        output_name = os.path.join(output_folder, f"frame_{frame_count}.jpg")
-        cv2.imwrite(output_name, frame)
-
-        # Extract text from the frame
-        extracted_text = extract_text_from_image(output_name, prompt)
-        print(f"Image: {output_name}, Extracted Text: {extracted_text}")
-
-        # Parse the extracted text into required fields
-        bottom_text, middle_text, top_text, tv_channel_name = parse_extracted_text(extracted_text)
-
-        results.append({
-            "image_name": output_name,
-            "Bottom_of_the_image": bottom_text,
-            "Middle_of_the_image": middle_text,
-            "Top_of_the_image": top_text,
-            "TV_channel_name": tv_channel_name
-        })
-
-        frame_count += 1
-
-    cap.release()
-    cv2.destroyAllWindows()
-
-    return results
-
-# Function to parse extracted text into required fields
-def parse_extracted_text(text):
-    # Dummy parsing logic, replace with actual parsing logic
-    lines = text.split('\n')
-    if len(lines) >= 4:
-        return lines[0], lines[1], lines[2], lines[3]
-    return "", "", "", ""
-
-# Endpoint to trigger video download, frame extraction, and text extraction
-@app.route('/process_video', methods=['POST'])
-def process_video():
-    data = request.get_json()
-    video_url = data['video_url']  # Example: 'https://quadz.blob.core.windows.net/newpoc/stitched_video_20240627130216.mp4'
-    
-    if video_url.startswith('https://www.youtube.com/'):
-        video_path = download_video_ytdlp(video_url)
-    elif video_url.startswith('https://quadz.blob.core.windows.net/'):
-        video_path = download_video_blob(video_url)
-    else:
-        return jsonify({"error": "Unsupported URL format."}), 400
 
-    results = extract_frames(video_path, OUTPUT_FOLDER, "Extract the text from the image?")
-    print(f"Processed video: {video_path}, Frames extracted: {len(results)}")
+# Job: overlay text as time ranges. A frame is only OCR'd when the text in one of its
+# regions changed, and each region's text is reported with the time it was on screen
+# ("headline X shown 00:01:12-00:01:40") instead of once per frame
+def process_text_ranges_job(video_url, channel, ocr_backend, progress, on_result, workspace):
+    with video_source(video_url) as video_path, \
+            ParquetResultSink(workspace.file("results.parquet"), on_result=on_result, workspace=workspace) as sink:
+        dead_letters = []
+        extract_frames(video_path, workspace.frames, rois=channel or "default", text_change=True, save=False,
+                       stats=progress, on_result=sink, collect=False, ocr_backend=ocr_backend, workspace=workspace,
+                       dead_letters=dead_letters)
+    ranges = text_ranges(read_results(sink.path), progress.get('last_timestamp', 0.0))
+    print(f"Processed video: {video_url}, Text changes: {sink.written}, Text ranges: {len(ranges)}")
 
     # Prepare CSV file for writing results
-    csv_file = "image_text_results.csv"
-    csv_header = ["Image_Name", "Extracted_Text"]
-
-    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(csv_header)
-
-        for result in results:
-            writer.writerow([result['image_name'], result['extracted_text']])
+    csv_file = write_results_csv(ranges, workspace.file("text_ranges_results.csv"),
+                                 ["Region", "Text", "Start_Time", "End_Time"],
+                                 ["region", "text", "start_time", "end_time"], workspace)
+
+    return {
+        "message": "Text range processing completed.",
+        "video_path": video_location(video_url, video_path),
+        "num_changes": sink.written,
+        "num_ranges": len(ranges),
+        "results_file": csv_file,
+        "results_parquet": sink.path,
+        **dead_letter_result(dead_letters, workspace)
+    }
 
-    print(f"Results saved to {csv_file}")
+# Job: the bottom news crawl. The ticker band is stitched across frames and only
+# newly scrolled-in text is sent for OCR, once per scroll cycle
+def process_ticker_text_job(video_url, channel, ocr_backend, progress, on_result, workspace):
+    with video_source(video_url) as video_path, \
+            ParquetResultSink(workspace.file("results.parquet"), on_result=on_result, workspace=workspace) as sink:
+        dead_letters = []
+        extract_frames(video_path, workspace.frames, ticker=channel or True, save=False, stats=progress, on_result=sink,
+                       collect=False, ocr_backend=ocr_backend, workspace=workspace, dead_letters=dead_letters)
+    print(f"Processed video: {video_url}, Frames tracked: {progress.get('ticker_frames', 0)}, Ticker segments: {sink.written}")
 
-    return jsonify({
-        "message": "Video processing completed.",
-        "video_path": video_path,
-        "num_frames": len(results),
-        "results_file": csv_file
-    })
+    # Prepare CSV file for writing results
+    csv_file = write_results_csv(read_results(sink.path), workspace.file("ticker_text_results.csv"),
+                                 ["Start_Time", "End_Time", "Ticker_Text"],
+                                 ["timestamp", "end_timestamp", "extracted_text"], workspace)
+
+    return {
+        "message": "Ticker text video processing completed.",
+        "video_path": video_location(video_url, video_path),
+        "num_frames": progress.get('ticker_frames', 0),
+        "num_segments": sink.written,
+        "results_file": csv_file,
+        "results_parquet": sink.path,
+        **dead_letter_result(dead_letters, workspace)
+    }
 
-# Endpoint for scrolling text extraction
-@app.route('/scrolling-text', methods=['POST'])
-def process_scrolling_text():
+# Function to validate the request and queue a job; returns the Flask response
+def submit_job(job, with_channel=True):
     data = request.get_json()
     video_url = data['video_url']  # Example: 'https://quadz.blob.core.windows.net/newpoc/stitched_video_20240627130216.mp4'
-    
-    if video_url.startswith('https://www.youtube.com/'):
-        video_path = download_video_ytdlp(video_url)
-    elif video_url.startswith('https://quadz.blob.core.windows.net/'):
-        video_path = download_video_blob(video_url)
-    else:
-        return jsonify({"error": "Unsupported URL format."}), 400
+    ocr_backend = data.get('ocr_backend')  # OCR backend name, see frame_pipeline/backends.py
+    channel = data.get('channel')  # Region layout to use, see frame_pipeline/roi.py
 
-    # Scrolling text extraction prompt
-    prompt = "Extract the text from the bottom of the image, middle of the image and top of the image and tv channel name?"
+    try:
+        check_video_url(video_url)
+        check_backend_name(ocr_backend)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    results = extract_frames(video_path, OUTPUT_FOLDER, prompt)
-    print(f"Processed video: {video_path}, Frames extracted: {len(results)}")
-
-    # Prepare CSV file for writing results
-    csv_file = "scrolling_image_text_results.csv"
-    csv_header = ["Image_Name", "Bottom_of_the_image", "Middle_of_the_image", "Top_of_the_image", "TV_channel_name"]
+    args = (video_url, channel, ocr_backend) if with_channel else (video_url, ocr_backend)
+    job_id = jobs.submit(job, *args)
+    return jsonify({"job_id": job_id, "status_url": url_for('jobs.job_status', job_id=job_id)}), 202
 
-    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(csv_header)
-
-        for result in results:
-            writer.writerow([
-                result['image_name'],
-                result['Bottom_of_the_image'],
-                result['Middle_of_the_image'],
-                result['Top_of_the_image'],
-                result['TV_channel_name']
-            ])
-
-    print(f"Results saved to {csv_file}")
+# Endpoint to trigger video download, frame extraction, and text extraction; returns a job id
+@app.route('/process_video', methods=['POST'])
+def process_video():
+    return submit_job(process_video_job, with_channel=False)
 
-    return jsonify({
-        "message": "Scrolling text video processing completed.",
-        "video_path": video_path,
-        "num_frames": len(results),
-        "results_file": csv_file
-    })
+# Endpoint for scrolling text extraction; returns a job id
+@app.route('/scrolling-text', methods=['POST'])
+def process_scrolling_text():
+    return submit_job(process_scrolling_text_job)
+
+# Endpoint for overlay text as time ranges; returns a job id
+@app.route('/text-ranges', methods=['POST'])
+def process_text_ranges():
+    return submit_job(process_text_ranges_job)
+
+# Endpoint for the bottom news crawl; returns a job id
+@app.route('/ticker-text', methods=['POST'])
+def process_ticker_text():
+    return submit_job(process_ticker_text_job)
+
+# Jobs that checkpoint their progress, by the name they record in their manifest
+RESUMABLE_JOBS = {
+    "process_video": process_video_job,
+    "scrolling_text": process_scrolling_text_job
+}
+
+# Endpoint to restart a failed or interrupted job from its checkpoint, with the same job id
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    checkpoint = jobs.checkpoint(job_id)
+    if checkpoint is None or checkpoint.data.get("job") not in RESUMABLE_JOBS:
+        return jsonify({"error": "No checkpoint for this job."}), 404
+
+    try:
+        jobs.submit(RESUMABLE_JOBS[checkpoint.data["job"]], *checkpoint.data["args"], job_id=job_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"job_id": job_id, "start_frame": checkpoint.start_frame,
+                    "status_url": url_for('jobs.job_status', job_id=job_id)}), 202
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,29 @@
+# Shared frame pipeline: source -> decode -> sample -> dedup -> OCR -> sink.
+# Every Flask app and script imports from here so that hot-loop work is done once.
+from .settings import DOWNLOAD_DIRECTORY, OUTPUT_FOLDER, DEFAULT_MODEL, DEFAULT_PROMPT
+from .download import ranged_download, TeeDownload
+from .sources import (download_video, download_video_ytdlp, download_video_blob, cached_download, open_video_source,
+                      video_source, video_location, youtube_stream_url, check_video_url)
+from .video_cache import VideoCache, canonical_key, default_video_cache
+from .decode import iter_frames, iter_frames_parallel
+from .dedup import (ahash, dhash, phash, hamming_distance, hamming_distances, block_signature, block_distance,
+                    BLOCK_THRESHOLD, hash_dedup, block_dedup, histogram_dedup,
+                    dedup_stage, save_hash_index, load_hash_index, keep_mask, content_key, frame_key)
+from .cache import OCRCache, default_cache
+from .client import OCRClient, default_client
+from .retry import CircuitOpenError, CircuitBreaker, circuit_breaker, backoff_delay
+from .backends import BACKEND_NAMES, TesseractBackend, HybridBackend, check_backend_name, get_backend
+from .checkpoint import MANIFEST_NAME, Checkpoint, resume_extract_frames
+from .jobs import LocalBroker, JobQueue
+from .workspace import Workspace, WorkspaceQuotaExceeded, check_workspace_id, cleanup_workspaces
+from .dispatch import RateLimiter, dispatch_ordered
+from .ocr import (encode_image, encode_frame, extract_text_from_bytes, extract_text_from_image, encode_stage,
+                  batch_frames, dead_letter, ocr_stage)
+from .prepare import ImagePreparer, encode_image_bytes, image_mime, colour_matters
+from .prefilter import text_score, text_prefilter
+from .roi import (DEFAULT_LAYOUTS, ROI_CSV_COLUMNS, load_layouts, get_layout, crop_region, split_rois, merge_rois,
+                  roi_change_stage, text_ranges, format_timestamp)
+from .ticker import ticker_box, scroll_offset, ticker_stage
+from .sinks import (save_frames, write_results_csv, write_roi_results_csv, write_results_xlsx, write_dead_letters,
+                    read_dead_letters, ParquetResultSink, read_results)
+from .pipeline import run_pipeline, open_frames, default_stages, extract_frames, reprocess_dead_letters
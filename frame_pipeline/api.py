@@ -0,0 +1,37 @@
+# Flask routes shared by the job apps. Flask is only imported here, so the scripts
+# that use the pipeline without a web server don't need it.
+from flask import Blueprint, Response, request, jsonify
+
+
+# Function to build the Blueprint serving a JobQueue's jobs: GET /jobs/<job_id> and
+# GET /jobs/<job_id>/events. Register it with app.register_blueprint; the status URL
+# of a job is url_for('jobs.job_status', job_id=...).
+def jobs_blueprint(jobs):
+    blueprint = Blueprint('jobs', __name__)
+
+    # Endpoint to poll a job: status, progress counters and, once done, the result
+    @blueprint.route('/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job id."}), 404
+        return jsonify(job)
+
+    # Endpoint to stream a job as it runs: each result, status change and progress counters,
+    # as server-sent events (resumable with Last-Event-ID) or NDJSON with ?format=ndjson
+    @blueprint.route('/jobs/<job_id>/events', methods=['GET'])
+    def job_events(job_id):
+        if jobs.get(job_id) is None:
+            return jsonify({"error": "Unknown job id."}), 404
+        since = request.args.get('since', 0, type=int)
+        if 'Last-Event-ID' in request.headers:
+            try:
+                since = int(request.headers['Last-Event-ID']) + 1
+            except ValueError:
+                return jsonify({"error": "Last-Event-ID must be an event id."}), 400
+        if request.args.get('format') == 'ndjson':
+            return Response(jobs.event_stream(job_id, since, "ndjson"), mimetype='application/x-ndjson')
+        return Response(jobs.event_stream(job_id, since), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+
+    return blueprint
@@ -0,0 +1,119 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+
+from . import settings
+from .client import default_client
+
+# An OCR backend is any object with a `name` and
+#     extract_texts(jpeg_list, prompt, model) -> [text, ...]
+# returning one text per JPEG, in order, and "Error: ..." strings on failure.
+# prompt is one string for every JPEG, or a list with one prompt per JPEG.
+# OCRClient (the remote chat-completions client) is the "openai" backend.
+
+
+# Function run in a worker process: OCR one JPEG with Tesseract.
+# Returns (text, mean word confidence 0-100, or -1 when nothing was recognised).
+def _tesseract_ocr(jpeg_bytes, lang):
+    import pytesseract
+
+    image = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return "Error: Could not decode image", -1
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    words = [(word, float(conf)) for word, conf in zip(data['text'], data['conf']) if word.strip() and float(conf) >= 0]
+    if not words:
+        return "", -1
+    text = " ".join(word for word, _ in words)
+    return text, sum(conf for _, conf in words) / len(words)
+
+
+# CPU-local OCR with Tesseract, run in a process pool so it scales across cores.
+# The prompt and model are ignored; results are plain recognised text.
+class TesseractBackend:
+    name = "tesseract"
+
+    def __init__(self, lang=settings.TESSERACT_LANG, workers=None):
+        self.lang = lang
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    # OCR each JPEG, returning (text, confidence) pairs
+    def extract_with_confidence(self, jpeg_list):
+        futures = [self.pool.submit(_tesseract_ocr, jpeg_bytes, self.lang) for jpeg_bytes in jpeg_list]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append((f"Error: Local OCR failed: {e}", -1))
+        return results
+
+    def extract_texts(self, jpeg_list, prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL):
+        return [text for text, _ in self.extract_with_confidence(jpeg_list)]
+
+    def close(self):
+        self.pool.shutdown()
+
+
+# Local first, remote for hard frames: frames that Tesseract reads with a mean
+# confidence below min_confidence (or fails on) are escalated to the remote backend.
+# Frames where Tesseract finds no text at all are not escalated.
+class HybridBackend:
+    name = "hybrid"
+
+    def __init__(self, local=None, remote=None, min_confidence=settings.LOCAL_OCR_MIN_CONFIDENCE):
+        self.local = local or TesseractBackend()
+        self.remote = remote or default_client()
+        self.min_confidence = min_confidence
+        self.workers = self.local.workers
+        self.escalated = 0
+
+    def extract_texts(self, jpeg_list, prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL):
+        results = self.local.extract_with_confidence(jpeg_list)
+        texts = [text for text, _ in results]
+        hard = [i for i, (text, confidence) in enumerate(results)
+                if text.startswith("Error:") or 0 <= confidence < self.min_confidence]
+        if hard:
+            self.escalated += len(hard)
+            if not isinstance(prompt, str):
+                prompt = [prompt[i] for i in hard]
+            remote_texts = self.remote.extract_texts([jpeg_list[i] for i in hard], prompt, model)
+            for i, text in zip(hard, remote_texts):
+                texts[i] = text
+        return texts
+
+
+# Names get_backend accepts
+BACKEND_NAMES = ("openai", "tesseract", "hybrid")
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+# Function to check an OCR backend name taken from a request; None (the default backend) passes
+def check_backend_name(name):
+    if name is not None and name not in BACKEND_NAMES:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    return name
+
+
+# Function to get a shared backend by name: "openai", "tesseract" or "hybrid".
+# Backend objects are passed through unchanged; None means settings.OCR_BACKEND.
+def get_backend(backend=None):
+    if backend is not None and not isinstance(backend, str):
+        return backend
+    name = backend or settings.OCR_BACKEND
+    if name == "openai":
+        return default_client()
+    with _backends_lock:
+        if name not in _backends:
+            if name not in ("tesseract", "hybrid"):
+                raise ValueError(f"Unknown OCR backend: {name}")
+            if "tesseract" not in _backends:
+                _backends["tesseract"] = TesseractBackend()
+            if name == "hybrid":
+                _backends["hybrid"] = HybridBackend(local=_backends["tesseract"])
+        return _backends[name]
@@ -0,0 +1,287 @@
+# Benchmarks for the shared frame pipeline.
+# Usage: python -m frame_pipeline.bench <video_path> [--dedup [METHOD]] [--ocr] [--target-fps N | --every-nth N | --keyframes] [--workers N] [--no-save] [--text-filter [THRESHOLD]]
+#        python -m frame_pipeline.bench --ocr-client N
+#        python -m frame_pipeline.bench --download MB
+#        python -m frame_pipeline.bench <video_path> --resume FAIL_AFTER
+#        python -m frame_pipeline.bench --image-prep FIXTURES_DIR [--backend NAME]
+import argparse
+import base64
+import difflib
+import json
+import os
+import random
+import tempfile
+import time
+import numpy as np
+import cv2
+import requests
+
+from . import settings
+from .backends import get_backend
+from .checkpoint import Checkpoint, resume_extract_frames
+from .client import OCRClient, build_payload
+from .decode import iter_frames
+from .download import download_session, ranged_download, stream_download
+from .mock_server import start_mock_blob_server, start_mock_server
+from .ocr import encode_frame
+from .pipeline import default_stages, open_frames, run_pipeline
+from .prepare import ImagePreparer
+from .retry import CircuitBreaker
+from .sinks import read_results
+
+
+# Function to time one pipeline run and return its stats
+def bench_pipeline(video_path, output_folder, dedup=False, ocr=False, sample=None, workers=None, save=True,
+                   text_filter=False):
+    stats = {}
+    start = time.perf_counter()
+    frames = open_frames(video_path, stats, sample, workers)
+    run_pipeline(frames, default_stages(output_folder, dedup=dedup, ocr=ocr, save=save, text_filter=text_filter), stats)
+    stats['seconds'] = time.perf_counter() - start
+    stats['decoded_fps'] = stats.get('decoded', 0) / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+# Function to compare per-frame OCR latency of module-level requests.post (new
+# connection per call) with the pooled OCRClient, against the local mock endpoint
+def bench_ocr_client(calls=200, jpeg_bytes=b"\xff\xd8" + b"\x00" * 20000):
+    server, url = start_mock_server()
+    try:
+        base64_image = base64.b64encode(jpeg_bytes).decode('utf-8')
+        payload = build_payload(base64_image, settings.DEFAULT_PROMPT, settings.DEFAULT_MODEL)
+
+        start = time.perf_counter()
+        for _ in range(calls):
+            requests.post(url, json=payload)
+        unpooled = (time.perf_counter() - start) / calls
+
+        client = OCRClient(api_key="mock", url=url)
+        start = time.perf_counter()
+        for _ in range(calls):
+            client.extract_text(jpeg_bytes)
+        pooled = (time.perf_counter() - start) / calls
+        client.close()
+    finally:
+        server.shutdown()
+
+    return {
+        "calls": calls,
+        "unpooled_ms_per_frame": unpooled * 1000,
+        "pooled_ms_per_frame": pooled * 1000,
+        "saved_ms_per_frame": (unpooled - pooled) * 1000
+    }
+
+
+# Function to compare a single streamed GET with the parallel ranged downloader on a
+# payload of size_mb megabytes from the local blob stand-in, each connection capped
+# at bandwidth bytes/second
+def bench_download(size_mb=64, connections=settings.DOWNLOAD_CONNECTIONS, bandwidth=8 * 1024 * 1024):
+    payload = os.urandom(size_mb * 1024 * 1024)
+    server, url = start_mock_blob_server(payload, bandwidth=bandwidth)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "single.mp4")
+            start = time.perf_counter()
+            stream_download(download_session(1), url, path)
+            single = time.perf_counter() - start
+
+            path = os.path.join(directory, "ranged.mp4")
+            start = time.perf_counter()
+            ranged_download(url, path, connections=connections, chunk_size=max(len(payload) // (connections * 4), 1024 * 1024))
+            ranged = time.perf_counter() - start
+            with open(path, 'rb') as f:
+                intact = f.read() == payload
+    finally:
+        server.shutdown()
+
+    return {
+        "size_mb": size_mb,
+        "connections": connections,
+        "single_seconds": single,
+        "ranged_seconds": ranged,
+        "speedup": single / ranged if ranged else 0.0,
+        "intact": intact
+    }
+
+
+# Function to check checkpoint/resume on a local video: the mock OCR endpoint goes down
+# after fail_after requests, the client's circuit breaker opens, its trial requests
+# (breaker_reset seconds apart) fail and the run fails, and a second run from the
+# checkpoint (with a fresh client, as a resume after the endpoint came back would
+# have) has to finish the video with every sampled frame written exactly once
+def bench_resume(video_path, fail_after=20, sample=None, max_retries=1, breaker_reset=0.1):
+    sample = {key: value for key, value in (sample or {}).items() if value}
+    server, url = start_mock_server(fail_after=fail_after)
+    options = {"ocr_cache": False, "text_filter": False, "save": False, "sample": sample}
+    clients = []
+
+    # Run once from the checkpoint with a new client of its own, returning stats and error
+    def run(checkpoint, results_path, directory):
+        client = OCRClient(api_key="mock", url=url, max_retries=max_retries,
+                           breaker=CircuitBreaker(reset=breaker_reset, trials=2))
+        clients.append(client)
+        stats = {}
+        try:
+            resume_extract_frames(video_path, directory, checkpoint, results_path, stats, ocr_backend=client, **options)
+        except Exception as e:
+            return stats, e
+        return stats, None
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Checkpoint(os.path.join(directory, "manifest.json"))
+            results_path = os.path.join(directory, "results.parquet")
+            first, error = run(checkpoint, results_path, directory)
+            if error is not None:
+                print(f"First run failed as expected: {error}")
+            resumed_from = checkpoint.start_frame
+            committed_calls = checkpoint.data.get("stats", {}).get('ocr_calls', 0)
+
+            server.fail_after = None
+            second, second_error = run(checkpoint, results_path, directory)
+            if second_error is not None:
+                raise second_error
+            indices = [row["index"] for row in read_results(results_path, columns=["index"])]
+            errors = sum(1 for row in read_results(results_path, columns=["extracted_text"])
+                         if row["extracted_text"].startswith("Error:"))
+    finally:
+        for client in clients:
+            client.close()
+        server.shutdown()
+
+    expected = {frame["index"] for frame in iter_frames(video_path, **sample)}
+    return {
+        "first_run_failed": error is not None,
+        "first_run_ocr_calls": first.get('ocr_calls', 0),
+        "resumed_from_frame": resumed_from,
+        "second_run_ocr_calls": second.get('ocr_calls', 0) - committed_calls,
+        "results": len(indices),
+        "error_results": errors,
+        "duplicate_results": len(indices) - len(set(indices)),
+        "missing_results": len(expected - set(indices)),
+        "dead_letters": len(checkpoint.data.get("dead_letters", []))
+    }
+
+
+# Words the generated fixtures are written with
+FIXTURE_WORDS = ("market", "election", "weather", "minister", "cricket", "budget", "monsoon", "traffic", "police",
+                 "court", "river", "festival", "highway", "airport", "school", "hospital", "rupee", "shares",
+                 "rain", "alert", "city", "council", "report", "update", "live", "breaking", "news", "today")
+
+
+# Function to write a fixed set of news-like test frames to directory: a gradient
+# background with noise, a top caption, a headline band and a ticker band, each with
+# known text. Seeded, so every run benchmarks the same images. Writes lossless PNGs
+# and labels.json ({file name: text, top to bottom}); returns the labels.
+def make_fixtures(directory, count=24, seed=0, size=(1280, 720)):
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed)
+    width, height = size
+    os.makedirs(directory, exist_ok=True)
+    labels = {}
+    for number in range(count):
+        ramp = np.linspace(rng.randint(20, 90), rng.randint(120, 200), width, dtype=np.float32)
+        image = np.dstack([ramp * rng.uniform(0.5, 1.0) for _ in range(3)]) * np.ones((height, 1, 1), np.float32)
+        image = np.clip(image + noise.normal(0, 12, image.shape), 0, 255).astype(np.uint8)
+
+        lines = []
+        bands = [(0.04, 0.12, None, 0.9), (0.70, 0.86, (30, 30, 160), 1.3), (0.86, 1.0, (120, 60, 0), 1.0)]
+        for top, bottom, colour, scale in bands:
+            if colour is not None:
+                cv2.rectangle(image, (0, int(top * height)), (width, int(bottom * height)), colour, -1)
+            text = " ".join(rng.choice(FIXTURE_WORDS) for _ in range(rng.randint(3, 6))).upper()
+            baseline = int((top + bottom) / 2 * height + 12 * scale)
+            cv2.putText(image, text, (24, baseline), cv2.FONT_HERSHEY_DUPLEX, scale, (255, 255, 255), 2, cv2.LINE_AA)
+            lines.append(text)
+
+        name = f"fixture_{number:03d}.png"
+        cv2.imwrite(os.path.join(directory, name), image)
+        labels[name] = "\n".join(lines)
+    with open(os.path.join(directory, "labels.json"), 'w', encoding='utf-8') as f:
+        json.dump(labels, f, indent=2)
+    return labels
+
+
+# Function to score OCR output against the expected text: similarity (0-1) of the
+# two after case and whitespace are normalised
+def text_accuracy(text, expected):
+    def normalise(value):
+        return " ".join(value.lower().split())
+    return difflib.SequenceMatcher(None, normalise(text), normalise(expected)).ratio()
+
+
+# Function to compare OCR accuracy with payload size on a fixed fixture set: the
+# frames in fixtures_dir (labels.json maps each file to its text; generated with
+# make_fixtures when missing) are OCR'd as full-quality JPEGs and then prepared
+# within each byte budget, per format. Reports mean payload bytes, accuracy and
+# preparation time per setting. The default backend is local Tesseract, so the run
+# costs nothing; pass "openai" to measure the remote model instead.
+def bench_image_prep(fixtures_dir, budgets=(150 * 1024, 64 * 1024, 32 * 1024, 16 * 1024), formats=("jpeg", "webp"),
+                     backend="tesseract"):
+    labels_path = os.path.join(fixtures_dir, "labels.json")
+    if os.path.exists(labels_path):
+        with open(labels_path, encoding='utf-8') as f:
+            labels = json.load(f)
+    else:
+        labels = make_fixtures(fixtures_dir)
+    images = [cv2.imread(os.path.join(fixtures_dir, name)) for name in labels]
+    expected = list(labels.values())
+    backend = get_backend(backend)
+    max_short_side = settings.OCR_IMAGE_MAX_SHORT_SIDE if backend.name == "openai" else None
+    stats = {"fixtures": len(images), "backend": backend.name}
+
+    def measure(label, encode):
+        start = time.perf_counter()
+        payloads = [encode(image) for image in images]
+        seconds = time.perf_counter() - start
+        texts = backend.extract_texts(payloads, settings.DEFAULT_PROMPT, settings.DEFAULT_MODEL)
+        stats[f"{label}_bytes"] = sum(len(payload) for payload in payloads) // len(payloads)
+        stats[f"{label}_accuracy"] = sum(map(text_accuracy, texts, expected)) / len(texts)
+        stats[f"{label}_prepare_ms"] = seconds * 1000 / len(payloads)
+
+    measure("baseline", lambda image: encode_frame(image, settings.JPEG_QUALITY, None))
+    for image_format in formats:
+        for budget in budgets:
+            preparer = ImagePreparer(budget, image_format, max_short_side=max_short_side)
+            measure(f"{image_format}_{budget // 1024}k", preparer.prepare)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the frame pipeline on a local video.")
+    parser.add_argument('video_path', nargs='?')
+    parser.add_argument('--output-folder', default=settings.OUTPUT_FOLDER)
+    parser.add_argument('--dedup', nargs='?', const=True, default=False, help="histogram, ahash, dhash or phash")
+    parser.add_argument('--ocr', action='store_true')
+    parser.add_argument('--target-fps', type=float)
+    parser.add_argument('--every-nth', type=int)
+    parser.add_argument('--keyframes', action='store_true')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--text-filter', nargs='?', type=float, const=True, default=False, metavar='THRESHOLD')
+    parser.add_argument('--ocr-client', type=int, metavar='CALLS', help="benchmark the pooled OCR client against a local mock")
+    parser.add_argument('--download', type=int, metavar='MB', help="benchmark the ranged downloader against a local mock")
+    parser.add_argument('--resume', type=int, metavar='FAIL_AFTER', help="fail a mock OCR run after N requests, then resume it")
+    parser.add_argument('--image-prep', metavar='FIXTURES_DIR',
+                        help="compare OCR accuracy with payload size per byte budget on a fixture set")
+    parser.add_argument('--backend', default="tesseract", help="OCR backend for --image-prep")
+    args = parser.parse_args()
+
+    if args.ocr_client:
+        stats = bench_ocr_client(args.ocr_client)
+    elif args.download:
+        stats = bench_download(args.download)
+    elif args.image_prep:
+        stats = bench_image_prep(args.image_prep, backend=args.backend)
+    elif args.video_path and args.resume:
+        sample = {"target_fps": args.target_fps, "every_nth": args.every_nth, "keyframes_only": args.keyframes}
+        stats = bench_resume(args.video_path, args.resume, sample)
+    elif args.video_path:
+        sample = {"target_fps": args.target_fps, "every_nth": args.every_nth, "keyframes_only": args.keyframes}
+        stats = bench_pipeline(args.video_path, args.output_folder, args.dedup, args.ocr, sample, args.workers, not args.no_save,
+                               args.text_filter)
+    else:
+        parser.error("a video_path, --ocr-client, --download or --image-prep is required")
+
+    for key, value in sorted(stats.items()):
+        print(f"{key}: {value}")
@@ -0,0 +1,82 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+from . import settings
+
+
+# Persistent OCR result cache in SQLite, keyed by frame hash + prompt + model.
+# Least recently used entries are evicted once the cache holds more than max_entries.
+class OCRCache:
+    def __init__(self, path=settings.OCR_CACHE_PATH, max_entries=settings.OCR_CACHE_MAX_ENTRIES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ocr_cache_last_used ON ocr_cache (last_used)")
+        self.db.commit()
+        self.size = self.db.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+
+    # Build the cache key for a frame hash, prompt and model
+    @staticmethod
+    def make_key(frame_hash, prompt, model):
+        prompt_digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+        return f"{frame_hash}|{model}|{prompt_digest}"
+
+    # Return the cached text, or None on a miss
+    def get(self, frame_hash, prompt, model):
+        key = self.make_key(frame_hash, prompt, model)
+        with self.lock:
+            row = self.db.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return row[0]
+
+    # Store text for a frame, evicting the least recently used tenth when over the limit
+    def put(self, frame_hash, prompt, model, text):
+        key = self.make_key(frame_hash, prompt, model)
+        with self.lock:
+            exists = self.db.execute("SELECT 1 FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, text, last_used) VALUES (?, ?, ?)", (key, text, time.time())
+            )
+            if not exists:
+                self.size += 1
+            if self.max_entries and self.size > self.max_entries:
+                evict = self.size - self.max_entries + max(1, self.max_entries // 10)
+                self.db.execute(
+                    "DELETE FROM ocr_cache WHERE key IN (SELECT key FROM ocr_cache ORDER BY last_used LIMIT ?)", (evict,)
+                )
+                self.size -= evict
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide OCR cache
+def default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = OCRCache()
+        return _default_cache
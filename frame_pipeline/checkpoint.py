@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import threading
+
+from .ocr import has_error_text
+from .pipeline import extract_frames, reprocess_dead_letters
+from .sinks import ParquetResultSink
+
+# File name of the manifest inside a job workspace
+MANIFEST_NAME = 'manifest.json'
+
+
+# Job manifest: the request that started the job, the index of the last frame whose
+# result is safely on disk, the number of results so far and the counters at that
+# point. Every write goes to a temp file that replaces the manifest, so a crash
+# leaves either the old or the new checkpoint, never a torn one.
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    # Index of the first frame still to be processed
+    @property
+    def start_frame(self):
+        last_index = self.data.get("last_index")
+        return 0 if last_index is None else last_index + 1
+
+    # Update fields of the manifest and write it out
+    def save(self, **fields):
+        with self.lock:
+            self.data.update(fields, updated=time.time())
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, default=str)
+            os.replace(temp_path, self.path)
+
+    # Record the job request the first time the job runs; a resumed job keeps the original
+    def start(self, job, *args):
+        if "job" not in self.data:
+            self.save(job=job, args=list(args), last_index=None, results=0, status="running")
+        else:
+            self.save(status="running")
+
+    # Commit the last frame written to disk, with the results count and counters so far.
+    # Dead letters past that frame are left out: a resume decodes those frames again.
+    def commit(self, last_index, results, stats, dead_letters=()):
+        self.save(last_index=last_index, results=results, stats=dict(stats),
+                  dead_letters=[record for record in dead_letters if record["index"] <= last_index])
+
+
+# Function to run extract_frames from a checkpoint. Frames up to the last committed one
+# are not decoded again, results are appended to the Parquet dataset at results_path and
+# the checkpoint is committed after every flushed part, including the part flushed when
+# the run fails. Frames OCR'd after the last commit are served by the OCR cache on the
+# next run, so a resume does not pay for them twice.
+# Results whose OCR failed are held out of the dataset: the frames are dead letters,
+# kept in the manifest with each commit and handed back through options["dead_letters"]
+# (a list). Once the pass over the video is done they are reprocessed (with those of
+# earlier runs); frames read this time are appended to the dataset, after the others,
+# and frames that fail again stay in the list for the next resume. The dataset counts
+# against the quota of options["workspace"], if given. Returns the dataset path.
+def resume_extract_frames(video_path, output_folder, checkpoint, results_path, stats=None, on_result=None, sample=None,
+                          **options):
+    stats = stats if stats is not None else {}
+    for key, value in checkpoint.data.get("stats", {}).items():
+        stats.setdefault(key, value)
+    done = checkpoint.data.get("results", 0)
+    sample = dict(sample or {}, start_frame=checkpoint.start_frame)
+    dead_letters = options.get("dead_letters")
+    if dead_letters is None:
+        dead_letters = options["dead_letters"] = []
+    # Dead letters at or past start_frame are decoded again by this pass anyway
+    dead_letters[:0] = [record for record in checkpoint.data.get("dead_letters", [])
+                        if record["index"] < checkpoint.start_frame]
+    if checkpoint.start_frame:
+        print(f"Resuming from frame {checkpoint.start_frame} ({done} results already written)")
+
+    def commit(last_row):
+        checkpoint.commit(last_row["index"], done + sink.written, stats, dead_letters)
+
+    # Pass a result to the sink, or hold it out when its OCR failed
+    def writer(target, resolved=None):
+        def write(result, result_stats):
+            if has_error_text(result):
+                if on_result:
+                    on_result(result, result_stats)
+                return
+            if resolved is not None:
+                resolved.add(result["index"])
+            target(result, result_stats)
+        return write
+
+    try:
+        with ParquetResultSink(results_path, on_result=on_result, on_flush=commit,
+                               workspace=options.get("workspace")) as sink:
+            extract_frames(video_path, output_folder, stats=stats, sample=sample, on_result=writer(sink), collect=False,
+                           **options)
+        written = sink.written
+
+        if dead_letters:
+            pending, retry, resolved, retry_stats = list(dead_letters), [], set(), {}
+            print(f"Reprocessing {len({record['index'] for record in pending})} frames whose OCR failed")
+
+            # The last committed frame stays where the pass left it
+            def commit_retry(last_row):
+                checkpoint.save(results=done + written + retry_sink.written, stats=dict(stats),
+                                dead_letters=[record for record in pending if record["index"] not in resolved])
+
+            with ParquetResultSink(results_path, on_result=on_result, on_flush=commit_retry,
+                                   workspace=options.get("workspace")) as retry_sink:
+                reprocess_dead_letters(video_path, pending, output_folder, stats=retry_stats,
+                                       on_result=writer(retry_sink, resolved), collect=False,
+                                       **dict(options, dead_letters=retry))
+            written += retry_sink.written
+            dead_letters[:] = retry
+            for key in ('ocr_calls', 'ocr_requests', 'ocr_cache_hits'):
+                if key in retry_stats:
+                    stats[key] = stats.get(key, 0) + retry_stats[key]
+            stats['dead_letters'] = len(retry)
+    except Exception:
+        checkpoint.save(status="failed")
+        raise
+    stats['results'] = done + written
+    checkpoint.save(status="done", results=stats['results'], dead_letters=dead_letters)
+    return sink.path
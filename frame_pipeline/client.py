@@ -0,0 +1,218 @@
+import json
+import time
+import base64
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import settings
+from .prepare import image_mime
+from .retry import RETRY_STATUSES, backoff_delay, circuit_breaker, retry_after_seconds
+
+
+# Function to build the chat-completions payload for one image (mime: its type)
+def build_payload(base64_image, prompt, model, mime="image/jpeg"):
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{mime};base64,{base64_image}"
+                        }
+                    }
+                ]
+            }
+        ],
+        "max_tokens": settings.MAX_TOKENS
+    }
+
+
+# Function to build one chat-completions payload carrying several images, asking
+# for a JSON object {"frames": [...]} with one text per image, in order.
+# prompt is one instruction for every image or a list of one per image (e.g. the
+# regions of a frame); mimes holds each image's type (default JPEG).
+def build_batch_payload(base64_images, prompt, model, mimes=None):
+    count = len(base64_images)
+    if not isinstance(prompt, str):
+        prompt = "Follow the instruction given for each image.\n" + "\n".join(
+            f"Image {number}: {image_prompt}" for number, image_prompt in enumerate(prompt, 1))
+    instructions = (
+        f"{prompt}\nThere are {count} images, numbered 1 to {count} in the order given. "
+        f"Reply with only a JSON object of the form {{\"frames\": [\"text of image 1\", ...]}} "
+        f"holding exactly {count} strings; use an empty string for an image without text."
+    )
+    content = [{"type": "text", "text": instructions}]
+    for base64_image, mime in zip(base64_images, mimes or ["image/jpeg"] * count):
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{mime};base64,{base64_image}"
+            }
+        })
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": settings.MAX_TOKENS * count
+    }
+
+
+# Function to split a batch reply into per-image texts; None if it doesn't match the batch
+def parse_batch_response(content, count):
+    try:
+        texts = json.loads(content)["frames"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(texts, list) or len(texts) != count:
+        return None
+    return [text if isinstance(text, str) else json.dumps(text, ensure_ascii=False) for text in texts]
+
+
+# Function to open a pooled HTTP session: httpx with HTTP/2 when httpx and h2
+# are installed, otherwise a requests.Session with a sized connection pool
+def open_session(pool_size, http2=True):
+    if http2:
+        try:
+            import h2  # noqa: F401
+            import httpx
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            return httpx.Client(http2=True, limits=limits)
+        except ImportError:
+            pass
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# Reusable OCR client: one pooled keep-alive session shared by every request
+class OCRClient:
+    name = "openai"
+
+    def __init__(self, api_key=None, url=None, pool_size=settings.OCR_POOL_SIZE, http2=True, timeout=settings.OCR_TIMEOUT,
+                 max_retries=settings.OCR_MAX_RETRIES, breaker=None):
+        self.url = url or settings.OPENAI_CHAT_URL
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # Shared by every client of the endpoint unless a breaker of its own is given
+        self.breaker = breaker or circuit_breaker(self.url)
+        self.session = open_session(pool_size, http2)
+        self.transport_errors = (requests.RequestException,)
+        if not isinstance(self.session, requests.Session):
+            import httpx
+            self.transport_errors += (httpx.TransportError,)
+        self.headers = {
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            "Authorization": f"Bearer {api_key or settings.api_key}"
+        }
+
+    # Post one chat-completions payload and return the raw response. Connection errors,
+    # 429 and 5xx replies are retried up to max_retries times with jittered backoff,
+    # waiting at least as long as a Retry-After header asks. The request counts once
+    # against the endpoint's circuit breaker, as a failure if its last attempt still got
+    # a connection error or 5xx. While the circuit is open the call waits for it to
+    # close (see CircuitBreaker.wait) and raises CircuitOpenError if it never does.
+    def post(self, payload):
+        self.breaker.wait()
+        try:
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                try:
+                    response = self.session.post(self.url, headers=self.headers, json=payload, timeout=self.timeout)
+                except self.transport_errors as e:
+                    if attempt == self.max_retries:
+                        self.breaker.record_failure()
+                        raise
+                    print(f"OCR request failed ({e}), retrying")
+                else:
+                    if response.status_code not in RETRY_STATUSES:
+                        self.breaker.record_success()
+                        return response
+                    if attempt == self.max_retries:
+                        if response.status_code == 429:
+                            self.breaker.record_success()
+                        else:
+                            self.breaker.record_failure()
+                        return response
+                    retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+                    print(f"OCR request got {response.status_code}, retrying")
+                time.sleep(backoff_delay(attempt, retry_after=retry_after))
+        finally:
+            self.breaker.release()
+
+    # Extract text from JPEG bytes
+    def extract_text(self, jpeg_bytes, prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL):
+        base64_image = base64.b64encode(jpeg_bytes).decode('utf-8')
+        response = self.post(build_payload(base64_image, prompt, model, image_mime(jpeg_bytes)))
+
+        if response.status_code != 200:
+            print(f"Error: {response.status_code} - {response.text}")
+            return "Error: Unable to extract text"
+
+        response_json = response.json()
+        if 'choices' not in response_json:
+            print(f"Error: Unexpected response format: {response_json}")
+            return "Error: Unexpected response format"
+
+        return response_json['choices'][0]['message']['content']
+
+    # Extract text from several JPEGs in one request; prompt is one string or a list of
+    # one per JPEG. Falls back to one request per image when the reply can't be split
+    # back into per-image texts
+    def extract_texts(self, jpeg_list, prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL):
+        prompts = [prompt] * len(jpeg_list) if isinstance(prompt, str) else list(prompt)
+        if len(jpeg_list) == 1:
+            return [self.extract_text(jpeg_list[0], prompts[0], model)]
+
+        base64_images = [base64.b64encode(jpeg_bytes).decode('utf-8') for jpeg_bytes in jpeg_list]
+        response = self.post(build_batch_payload(base64_images, prompt, model,
+                                                 [image_mime(jpeg_bytes) for jpeg_bytes in jpeg_list]))
+
+        if response.status_code != 200:
+            print(f"Error: {response.status_code} - {response.text}")
+            return ["Error: Unable to extract text"] * len(jpeg_list)
+
+        response_json = response.json()
+        if 'choices' not in response_json:
+            print(f"Error: Unexpected response format: {response_json}")
+            return ["Error: Unexpected response format"] * len(jpeg_list)
+
+        texts = parse_batch_response(response_json['choices'][0]['message']['content'], len(jpeg_list))
+        if texts is None:
+            print("Error: Batch reply did not match the batch, retrying frames one by one")
+            return [self.extract_text(jpeg_bytes, image_prompt, model)
+                    for jpeg_bytes, image_prompt in zip(jpeg_list, prompts)]
+        return texts
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+# Function to get the process-wide OCR client shared by every app and script
+def default_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OCRClient()
+        return _default_client
@@ -0,0 +1,291 @@
+import os
+import json
+import math
+import queue
+import subprocess
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+
+from . import settings
+
+# Seek instead of grabbing forward when the next wanted frame is further away than this
+SEEK_GAP_FRAMES = 90
+
+
+# Function to read the frame rate of an open capture, falling back when unknown
+def capture_fps(cap, default=25.0):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    return fps if fps and fps > 0 else default
+
+
+# Function to list keyframe timestamps (seconds from the first frame) with ffprobe.
+# pts_time counts from the stream's start_time, which is not 0 in e.g. MPEG-TS
+# recordings, so it is subtracted to match the frame positions OpenCV seeks to.
+def keyframe_timestamps(video_path):
+    command = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+        '-show_entries', 'stream=start_time:frame=pts_time', '-of', 'json', video_path
+    ]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise RuntimeError(f"Could not list keyframes with ffprobe: {e}")
+    probe = json.loads(output or '{}')
+    streams = probe.get('streams') or [{}]
+    start = float(streams[0].get('start_time') or 0.0)
+    return [float(frame['pts_time']) - start for frame in probe.get('frames', []) if 'pts_time' in frame]
+
+
+# Function to turn a sampling mode into the step between kept frames
+def sample_step(fps, target_fps=None, every_nth=None):
+    if every_nth:
+        return max(1, int(every_nth))
+    if target_fps:
+        return max(1, math.ceil(fps / target_fps))
+    return 1
+
+
+# Function to build a frame record and count it as decoded
+def _frame_record(index, fps, image, stats):
+    if stats is not None:
+        stats['decoded'] = stats.get('decoded', 0) + 1
+    return {
+        "index": index,
+        "timestamp": index / fps,
+        "image": image
+    }
+
+
+# Function to count frames that were grabbed but never converted to BGR
+def _count_skipped(stats, count=1):
+    if stats is not None:
+        stats['skipped'] = stats.get('skipped', 0) + count
+
+
+# Function to decode frames [start, end) at a fixed step; skipped frames are only grabbed
+def _iter_stepped(cap, fps, step, stats, start=0, end=None):
+    index = start
+    while end is None or index < end:
+        if index % step == 0:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield _frame_record(index, fps, frame, stats)
+        else:
+            if not cap.grab():
+                break
+            _count_skipped(stats)
+        index += 1
+
+
+# Function to decode only the given frame indices, seeking across large gaps.
+# position is the index of the next frame the capture will return.
+def _iter_indices(cap, fps, indices, stats, position=0, seek_gap=SEEK_GAP_FRAMES):
+    for target in indices:
+        if target < position:
+            continue
+        if target - position > seek_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+        while position < target:
+            if not cap.grab():
+                return
+            _count_skipped(stats)
+            position += 1
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        yield _frame_record(target, fps, frame, stats)
+        position += 1
+
+
+# Function to decode frames of a video as frame records.
+# Sampling modes (at most one is used, in this order of precedence):
+#   timestamps    - list of seconds to decode
+#   keyframes_only - decode only the keyframes listed by ffprobe
+#   every_nth     - keep every N-th frame
+#   target_fps    - keep about target_fps frames per second
+# Frames that are not kept are grabbed or seeked over, never retrieved.
+# start_frame seeks past the frames before it (used to resume from a checkpoint).
+def iter_frames(video_path, stats=None, target_fps=None, every_nth=None, keyframes_only=False, timestamps=None,
+                start_frame=0):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print("Error: Could not open video.")
+        return
+
+    fps = capture_fps(cap)
+    try:
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        if keyframes_only and timestamps is None:
+            timestamps = keyframe_timestamps(video_path)
+        if timestamps is not None:
+            indices = sorted({int(round(t * fps)) for t in timestamps})
+            yield from _iter_indices(cap, fps, indices, stats, position=start_frame)
+        else:
+            yield from _iter_stepped(cap, fps, sample_step(fps, target_fps, every_nth), stats, start_frame)
+    finally:
+        cap.release()
+
+
+# Default number of frames in one time range decoded by a worker: every range starts
+# with a seek, which decodes from the keyframe before it
+SEGMENT_FRAMES = 250
+
+
+# Function run in a worker process: decode its share of the time ranges, in order,
+# copying each kept frame into a free slot of the shared frame buffer. The parent sends
+# a slot back on `free` once it has copied the frame out. `messages` carries
+# ("frame", slot, index, shape, dtype) per frame, ("done", skipped) after each range and
+# ("error", exception) if decoding fails. Only slot numbers go through the queues.
+def _decode_worker(video_path, tasks, buffer_name, slot_bytes, free, messages):
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        for start, end, step, indices in tasks:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                raise OSError(f"Could not open video {video_path} to decode frames {start}-{end}")
+            stats = {}
+            fps = capture_fps(cap)
+            try:
+                if start:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                if indices is not None:
+                    records = _iter_indices(cap, fps, indices, stats, position=start)
+                else:
+                    records = _iter_stepped(cap, fps, step, stats, start, end)
+                for record in records:
+                    image = record["image"]
+                    if image.nbytes > slot_bytes:
+                        raise ValueError(f"Frame {record['index']} is larger than the video's frame size")
+                    slot = free.get()
+                    np.ndarray(image.shape, image.dtype, buffer.buf, slot * slot_bytes)[...] = image
+                    messages.put(("frame", slot, record["index"], image.shape, image.dtype.str))
+            finally:
+                cap.release()
+            messages.put(("done", stats.get('skipped', 0)))
+    except Exception as e:
+        messages.put(("error", e))
+    finally:
+        buffer.close()
+
+
+# Function to wait for a worker's next message; fails if the worker died without one
+def _next_message(process, messages):
+    while True:
+        try:
+            return messages.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                try:
+                    return messages.get(timeout=1)
+                except queue.Empty:
+                    raise RuntimeError(f"Decode worker exited with code {process.exitcode}")
+
+
+# Function to split a video into (start, end) frame ranges; the last range is open-ended
+def segment_ranges(frame_count, segment_frames=SEGMENT_FRAMES):
+    starts = list(range(0, frame_count, segment_frames)) or [0]
+    return [(start, start + segment_frames) for start in starts[:-1]] + [(starts[-1], None)]
+
+
+# Function to split the frames to decode into worker tasks (start, end, step, indices);
+# returns the tasks and the most frames any one of them keeps
+def _plan_tasks(frame_count, segment_frames, step, indices, start_frame):
+    tasks = []
+    most = 0
+    for start, end in segment_ranges(frame_count, segment_frames):
+        if end is not None and end <= start_frame:
+            continue
+        start = max(start, start_frame)
+        segment_indices = None
+        if indices is not None:
+            segment_indices = [i for i in indices if i >= start and (end is None or i < end)]
+            if not segment_indices:
+                continue
+            kept = len(segment_indices)
+        else:
+            kept = -(-((end or frame_count) - start) // step)
+        most = max(most, kept)
+        tasks.append((start, end, step, segment_indices))
+    return tasks, most
+
+
+# Function to decode a video in parallel worker processes, one time range per task;
+# worker i takes ranges i, i + workers, ... Yields the same frame records, in the same
+# order, as iter_frames with the same sampling options. Frames are passed through a
+# shared memory buffer of frame-sized slots, not pickled: each worker owns up to a
+# range's worth of slots and waits for a free one when they are all full, so memory is
+# bounded by buffer_bytes whatever the resolution and range length. Each frame is copied
+# out of its slot once, when it is yielded. Workers are only dropped when the buffer
+# can't give each of them two slots; with one worker left (or a single range) the video
+# is decoded sequentially.
+def iter_frames_parallel(video_path, stats=None, workers=None, segment_frames=SEGMENT_FRAMES,
+                         target_fps=None, every_nth=None, keyframes_only=False, timestamps=None, start_frame=0,
+                         buffer_bytes=settings.DECODE_BUFFER_BYTES):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print("Error: Could not open video.")
+        return
+    fps = capture_fps(cap)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_bytes = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) * int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 3
+    cap.release()
+
+    if keyframes_only and timestamps is None:
+        timestamps = keyframe_timestamps(video_path)
+    indices = None
+    if timestamps is not None:
+        indices = sorted({int(round(t * fps)) for t in timestamps})
+    step = sample_step(fps, target_fps, every_nth)
+
+    # Without a frame count or frame size the video can't be split; decode it sequentially
+    tasks, most = _plan_tasks(frame_count, segment_frames, step, indices, start_frame) if frame_count > 0 else ([], 0)
+    slots = buffer_bytes // frame_bytes if frame_bytes else 0
+    workers = min(workers or os.cpu_count() or 1, len(tasks), slots // 2)
+    if workers <= 1:
+        yield from iter_frames(video_path, stats, target_fps, every_nth, keyframes_only, timestamps, start_frame)
+        return
+
+    ring = max(1, min(most, slots // workers))
+    context = multiprocessing.get_context()
+    buffer = shared_memory.SharedMemory(create=True, size=workers * ring * frame_bytes)
+    channels = []
+    try:
+        for worker in range(workers):
+            free, messages = context.Queue(), context.Queue()
+            for slot in range(worker * ring, (worker + 1) * ring):
+                free.put(slot)
+            process = context.Process(target=_decode_worker, daemon=True,
+                                      args=(video_path, tasks[worker::workers], buffer.name, frame_bytes, free,
+                                            messages))
+            process.start()
+            channels.append((process, free, messages))
+
+        for number in range(len(tasks)):
+            process, free, messages = channels[number % workers]
+            while True:
+                message = _next_message(process, messages)
+                if message[0] == "error":
+                    raise message[1]
+                if message[0] == "done":
+                    if message[1]:
+                        _count_skipped(stats, message[1])
+                    break
+                _, slot, index, shape, dtype = message
+                image = np.ndarray(shape, dtype, buffer.buf, slot * frame_bytes).copy()
+                free.put(slot)
+                yield _frame_record(index, fps, image, stats)
+    finally:
+        for process, free, messages in channels:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            free.close()
+            messages.close()
+        buffer.close()
+        buffer.unlink()
@@ -0,0 +1,212 @@
+import hashlib
+import numpy as np
+import cv2
+
+# Hash size in bits per side; every hash is HASH_SIZE * HASH_SIZE = 64 bits
+HASH_SIZE = 8
+
+# Default Hamming distance at or below which two frames count as duplicates. A 64-bit
+# hash of a whole-frame thumbnail only sees scene-level change: frames that differ
+# only in overlay text (a new headline on the same background) are mostly within it,
+# so the hashes are for scene dedup and the default method is "blockdiff".
+DEFAULT_THRESHOLD = 5
+
+# Block-difference signature: a grayscale thumbnail BLOCK_WIDTH pixels wide (height
+# by aspect ratio) cut into BLOCK_SIZE x BLOCK_SIZE blocks, each block stored as the
+# means of its BLOCK_CELLS x BLOCK_CELLS cells (uint8), so a 16:9 frame signs to
+# 22x40x4 = 3,520 bytes instead of a 14,400-byte thumbnail. Two frames differ when
+# the mean absolute cell difference of any block is above BLOCK_THRESHOLD grey levels.
+# At 1280x720 a block covers 32x32 source pixels, about one character of a headline;
+# block means alone miss a changed character (the ink is about the same), the cells
+# don't. On 200 generated broadcast-style frames re-encoded as JPEG, repeats of the
+# same frame stayed at or below 1.5 and a one-character headline change was at least
+# 2.5, so the threshold sits between them. Cost: camera motion or a moving anchor
+# also counts as change, so fewer frames are dropped than with the hashes; that is
+# the price of never skipping a text change.
+BLOCK_WIDTH = 160
+BLOCK_SIZE = 4
+BLOCK_CELLS = 2
+BLOCK_THRESHOLD = 2.0
+
+
+# Function to build the histogram signature used by the original scripts
+def histogram_signature(image):
+    gray_frame = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    histogram = cv2.calcHist([gray_frame], [0], None, [256], [0, 256])
+    histogram /= histogram.sum()
+    return tuple(histogram.flatten())
+
+
+# Function to shrink a frame to a small grayscale thumbnail (resize first, it's cheaper)
+def thumbnail(image, width, height):
+    small = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small
+
+
+# Function to pack a boolean bit matrix into a 64-bit integer
+def pack_bits(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+# Average hash: each pixel of an 8x8 thumbnail against the thumbnail mean
+def ahash(image):
+    small = thumbnail(image, HASH_SIZE, HASH_SIZE)
+    return pack_bits(small > small.mean())
+
+
+# Difference hash: each pixel of a 9x8 thumbnail against its right-hand neighbour
+def dhash(image):
+    small = thumbnail(image, HASH_SIZE + 1, HASH_SIZE)
+    return pack_bits(small[:, 1:] > small[:, :-1])
+
+
+# Perceptual hash: low-frequency 8x8 DCT block of a 32x32 thumbnail against its median
+def phash(image):
+    small = thumbnail(image, HASH_SIZE * 4, HASH_SIZE * 4).astype(np.float32)
+    low = cv2.dct(small)[:HASH_SIZE, :HASH_SIZE]
+    return pack_bits(low > np.median(low.ravel()[1:]))
+
+
+# Function to build the block-difference signature of a frame: a (rows, cols,
+# BLOCK_CELLS * BLOCK_CELLS) uint8 array of each block's cell means
+def block_signature(image):
+    height, width = image.shape[:2]
+    small = thumbnail(image, BLOCK_WIDTH, max(BLOCK_SIZE, round(BLOCK_WIDTH * height / width)))
+    rows, cols, cell = small.shape[0] // BLOCK_SIZE, small.shape[1] // BLOCK_SIZE, BLOCK_SIZE // BLOCK_CELLS
+    cells = small[:rows * BLOCK_SIZE, :cols * BLOCK_SIZE].reshape(
+        rows, BLOCK_CELLS, cell, cols, BLOCK_CELLS, cell).mean(axis=(2, 5))
+    return np.round(cells.transpose(0, 2, 1, 3).reshape(rows, cols, BLOCK_CELLS * BLOCK_CELLS)).astype(np.uint8)
+
+
+# Function to compare two block signatures: the largest mean absolute cell difference
+# of any block, in grey levels
+def block_distance(a, b):
+    rows, cols = min(a.shape[0], b.shape[0]), min(a.shape[1], b.shape[1])
+    diff = np.abs(a[:rows, :cols].astype(np.int16) - b[:rows, :cols].astype(np.int16))
+    return float(diff.mean(axis=2).max())
+
+
+HASH_FUNCTIONS = {
+    "ahash": ahash,
+    "dhash": dhash,
+    "phash": phash,
+}
+
+
+# Function to count differing bits between two hashes
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+# Function to compute Hamming distances from one hash to an array of hashes
+def hamming_distances(hashes, value):
+    xor = np.asarray(hashes, dtype=np.uint64) ^ np.uint64(value)
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+# Stage that drops a frame when its histogram equals the previous frame's
+def histogram_dedup():
+    def stage(frames, stats):
+        previous = None
+        for frame in frames:
+            signature = histogram_signature(frame["image"])
+            if previous is None or signature != previous:
+                yield frame
+            else:
+                stats['duplicates'] = stats.get('duplicates', 0) + 1
+            previous = signature
+    return stage
+
+
+# Stage that drops a frame when no block of its block signature differs from the last
+# kept frame's by more than threshold grey levels (see BLOCK_THRESHOLD)
+def block_dedup(threshold=BLOCK_THRESHOLD):
+    def stage(frames, stats):
+        last_kept = None
+        for frame in frames:
+            signature = block_signature(frame["image"])
+            if last_kept is None or block_distance(signature, last_kept) > threshold:
+                last_kept = signature
+                yield frame
+            else:
+                stats['duplicates'] = stats.get('duplicates', 0) + 1
+    return stage
+
+
+# Stage that drops a frame when its perceptual hash is within threshold bits of
+# the last kept frame. The hash is stored on the frame as frame["hash"] and
+# the method name as frame["hash_method"].
+def hash_dedup(method="dhash", threshold=DEFAULT_THRESHOLD):
+    hash_function = HASH_FUNCTIONS[method]
+
+    def stage(frames, stats):
+        last_kept = None
+        for frame in frames:
+            frame["hash"] = hash_function(frame["image"])
+            frame["hash_method"] = method
+            if last_kept is None or hamming_distance(frame["hash"], last_kept) > threshold:
+                last_kept = frame["hash"]
+                yield frame
+            else:
+                stats['duplicates'] = stats.get('duplicates', 0) + 1
+    return stage
+
+
+# Function to build a dedup stage by name: "blockdiff", "histogram" or one of
+# HASH_FUNCTIONS; threshold=None takes the method's default
+def dedup_stage(method="blockdiff", threshold=None):
+    if method == "blockdiff":
+        return block_dedup(BLOCK_THRESHOLD if threshold is None else threshold)
+    if method == "histogram":
+        return histogram_dedup()
+    if method not in HASH_FUNCTIONS:
+        raise ValueError(f"Unknown dedup method: {method}")
+    return hash_dedup(method, DEFAULT_THRESHOLD if threshold is None else threshold)
+
+
+# Function to save a per-job hash index (frame names + hashes, or an array of block
+# signatures) as a compact .npz file
+def save_hash_index(index_path, names, hashes):
+    hashes = hashes if isinstance(hashes, np.ndarray) else np.asarray(hashes, dtype=np.uint64)
+    np.savez(index_path, names=np.asarray(names, dtype=str), hashes=hashes)
+
+
+# Function to load a hash index saved by save_hash_index
+def load_hash_index(index_path):
+    with np.load(index_path) as data:
+        return [str(name) for name in data['names']], data['hashes']
+
+
+# Function to mark which entries of a hash index to keep: each hash is compared
+# with the last kept hash, the same rule hash_dedup applies while decoding.
+# For block signatures pass distance=block_distance and a BLOCK_THRESHOLD.
+def keep_mask(hashes, threshold=DEFAULT_THRESHOLD, distance=hamming_distance):
+    keep = np.zeros(len(hashes), dtype=bool)
+    last_kept = None
+    for i, value in enumerate(hashes.tolist() if distance is hamming_distance else hashes):
+        if last_kept is None or distance(value, last_kept) > threshold:
+            keep[i] = True
+            last_kept = value
+    return keep
+
+
+# Function to return a content key for an image: a 128-bit digest of its pixels and
+# shape. The OCR cache is keyed on this, not on the perceptual hashes above: those
+# are built to match frames that look alike, and two frames that differ only in
+# their text often hash the same.
+def content_key(image):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(image.shape).encode('ascii'))
+    digest.update(np.ascontiguousarray(image).data)
+    return f"blake2b:{digest.hexdigest()}"
+
+
+# Function to return a frame's OCR cache key: frame["key"] if a stage already set
+# one (e.g. an unchanged region reusing the key of the crop it was read from), else
+# the content key of its image
+def frame_key(frame):
+    if "key" not in frame:
+        frame["key"] = content_key(frame["image"])
+    return frame["key"]
@@ -0,0 +1,64 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import settings
+
+
+# Token-bucket limiter for requests per minute and tokens per minute.
+# Either limit may be None (unlimited). Safe to share between threads.
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_budget = float(requests_per_minute or 0)
+        self.token_budget = float(tokens_per_minute or 0)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Refill both buckets for the time elapsed since the last call
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        if self.requests_per_minute:
+            self.request_budget = min(self.requests_per_minute, self.request_budget + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self.token_budget = min(self.tokens_per_minute, self.token_budget + elapsed * self.tokens_per_minute / 60)
+
+    # Block until one request of the given token cost fits in both budgets
+    def acquire(self, tokens=0):
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self.lock:
+                self._refill()
+                wait = 0.0
+                if self.requests_per_minute and self.request_budget < 1:
+                    wait = max(wait, (1 - self.request_budget) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute and self.token_budget < tokens:
+                    wait = max(wait, (tokens - self.token_budget) * 60 / self.tokens_per_minute)
+                if wait == 0.0:
+                    if self.requests_per_minute:
+                        self.request_budget -= 1
+                    if self.tokens_per_minute:
+                        self.token_budget -= tokens
+                    return
+            time.sleep(wait)
+
+
+# Function to run call(frame) for each frame on a thread pool, keeping at most
+# `concurrency` calls in flight and yielding (frame, result) in input order.
+# Upstream frames keep being pulled (decoded) while earlier calls are in flight.
+def dispatch_ordered(frames, call, concurrency=settings.OCR_CONCURRENCY):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for frame in frames:
+            pending.append((frame, executor.submit(call, frame)))
+            if len(pending) >= concurrency:
+                head, future = pending.popleft()
+                yield head, future.result()
+        while pending:
+            head, future = pending.popleft()
+            yield head, future.result()
@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import time
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import settings
+from .retry import RETRY_STATUSES, backoff_delay, retry_after_seconds
+
+
+# Function to open a requests session with one pooled connection per download worker
+def download_session(connections):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# Function to read size, range support and validator (ETag / Last-Modified) of a URL
+def probe_url(session, url):
+    response = session.head(url, allow_redirects=True, timeout=settings.DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+    size = int(response.headers.get('Content-Length', 0))
+    ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    validator = response.headers.get('ETag') or response.headers.get('Last-Modified') or ''
+    return size, ranges, validator
+
+
+# Function to write bytes at an offset: os.pwrite where available, seek + write otherwise
+def write_at(fd, data, offset):
+    if hasattr(os, 'pwrite'):
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data = data[written:]
+            offset += written
+    else:
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, data)
+
+
+# Function to download a URL to a single file with one large-buffer stream
+def stream_download(session, url, path, buffer_size=settings.DOWNLOAD_BUFFER_SIZE):
+    with session.get(url, stream=True, timeout=settings.DOWNLOAD_TIMEOUT) as r:
+        r.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=buffer_size):
+                f.write(chunk)
+    return path
+
+
+# Function to download a URL with concurrent HTTP Range requests into a preallocated
+# file. Progress is kept in "<path>.part.json" (finished chunks + validator) so an
+# interrupted download resumes where it stopped, as long as the ETag/Last-Modified
+# still match. Servers without range support get a single streamed GET.
+# A chunk that gets a connection error, a short read, 429 or 5xx is fetched again up
+# to `retries` times with jittered backoff; a 200 reply to a range request means the
+# file changed under the validator and fails the download at once.
+def ranged_download(url, path, connections=settings.DOWNLOAD_CONNECTIONS, chunk_size=settings.DOWNLOAD_CHUNK_SIZE,
+                    buffer_size=settings.DOWNLOAD_BUFFER_SIZE, session=None, retries=settings.DOWNLOAD_RETRIES):
+    session = session or download_session(connections)
+    size, ranges, validator = probe_url(session, url)
+    if not ranges or size <= chunk_size:
+        return stream_download(session, url, path, buffer_size)
+
+    part_path = path + '.part'
+    state_path = part_path + '.json'
+    chunks = [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+    done = set()
+    if os.path.exists(part_path) and os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('validator') == validator and state.get('size') == size and state.get('chunk_size') == chunk_size:
+            done = set(state.get('done', []))
+
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+    lock = threading.Lock()
+    try:
+        if not done:
+            os.ftruncate(fd, size)
+
+        def save_state():
+            with open(state_path, 'w', encoding='utf-8') as f:
+                json.dump({'validator': validator, 'size': size, 'chunk_size': chunk_size, 'done': sorted(done)}, f)
+
+        # Write one chunk to the file; returns None when done, else the error to retry
+        # and the wait a Retry-After header asks for
+        def fetch_once(start, end):
+            headers = {'Range': f'bytes={start}-{end}'}
+            if validator:
+                headers['If-Range'] = validator
+            offset = start
+            try:
+                with session.get(url, headers=headers, stream=True, timeout=settings.DOWNLOAD_TIMEOUT) as r:
+                    if r.status_code in RETRY_STATUSES:
+                        return (IOError(f"Got {r.status_code} for bytes {start}-{end}"),
+                                retry_after_seconds(r.headers.get('Retry-After')))
+                    if r.status_code == 200:
+                        raise IOError(f"Server ignored range request ({r.status_code}), file may have changed")
+                    r.raise_for_status()
+                    for data in r.iter_content(chunk_size=buffer_size):
+                        write_at(fd, data, offset)
+                        offset += len(data)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                return e, None
+            if offset != end + 1:
+                return IOError(f"Short read for bytes {start}-{end}"), None
+            return None
+
+        def fetch(number):
+            start, end = chunks[number]
+            for attempt in range(retries + 1):
+                failure = fetch_once(start, end)
+                if failure is None:
+                    break
+                error, retry_after = failure
+                if attempt == retries:
+                    raise error
+                print(f"Chunk {number} failed ({error}), retrying")
+                time.sleep(backoff_delay(attempt, retry_after=retry_after))
+            with lock:
+                done.add(number)
+                save_state()
+
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            for future in [executor.submit(fetch, n) for n in range(len(chunks)) if n not in done]:
+                future.result()
+    finally:
+        os.close(fd)
+
+    os.replace(part_path, path)
+    os.remove(state_path)
+    return path
+
+
+# Serves a TeeDownload to local readers: HEAD and single Range requests, like the
+# blob store behind it
+class TeeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        tee = self.server.tee
+        start, end, status = 0, tee.size - 1, 200
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', '').strip())
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2) or end), end)
+            else:
+                start = max(0, tee.size - int(match.group(2)))
+            status = 206
+        if start > end:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{tee.size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{tee.size}")
+        # FFmpeg asks for Connection: close, but reuses the connection unless the reply says so
+        if self.headers.get('Connection', '').lower() == 'close':
+            self.send_header("Connection", "close")
+        self.end_headers()
+        if not body:
+            return
+        try:
+            if start > tee.available + tee.readahead:
+                tee.relay(self.wfile, start, end)
+            else:
+                tee.copy(self.wfile, start, end)
+        except OSError:
+            # The reader went away (it seeks by dropping the connection), or the download failed
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Tees a video stream into a file: one sequential download writes the URL to path,
+# and a local HTTP server (url) serves the same bytes to the decoder as they arrive.
+# A range request at or up to `readahead` bytes past the downloaded part waits for the
+# download and reads from the file; one further ahead (an index at the end of the file)
+# is passed through to the source, so each byte crosses the network once and seeks
+# don't stall. on_done(path) is called once the file is complete, on_done(None) if the
+# download failed or was cancelled (the partial file is deleted). Closing the tee stops
+# the local server only: the download goes on in the background unless cancelled.
+class TeeDownload:
+    def __init__(self, source_url, path, on_done=None, session=None, readahead=settings.TEE_READAHEAD,
+                 buffer_size=settings.DOWNLOAD_BUFFER_SIZE):
+        self.source_url = source_url
+        self.path = path
+        self.on_done = on_done
+        self.session = session or download_session(2)
+        self.readahead = readahead
+        self.buffer_size = buffer_size
+        self.size = 0
+        self.available = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+        self.changed = threading.Condition()
+        self.server = None
+        self.url = None
+
+    # Start the download and the local server. Returns False, without starting either,
+    # when the source can't answer range requests (the decoder could not seek).
+    def start(self):
+        size, ranges, _ = probe_url(self.session, self.source_url)
+        if not ranges or not size:
+            return False
+        self.size = size
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        open(self.path, 'wb').close()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), TeeHandler)
+        self.server.daemon_threads = True
+        self.server.tee = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self.download, daemon=True).start()
+        name = urllib.parse.quote(os.path.basename(self.path))
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/{name}"
+        return True
+
+    def download(self):
+        error = None
+        try:
+            with self.session.get(self.source_url, stream=True, timeout=settings.DOWNLOAD_TIMEOUT) as r:
+                r.raise_for_status()
+                with open(self.path, 'r+b') as f:
+                    for data in r.iter_content(chunk_size=self.buffer_size):
+                        if self.cancelled:
+                            raise IOError("Download cancelled")
+                        f.write(data)
+                        f.flush()
+                        with self.changed:
+                            self.available += len(data)
+                            self.changed.notify_all()
+            if self.available != self.size:
+                raise IOError(f"Short read: {self.available} of {self.size} bytes")
+        except Exception as e:
+            error = e
+            print(f"Error: download of {self.source_url} failed: {e}")
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        with self.changed:
+            self.error = error
+            self.finished = True
+            self.changed.notify_all()
+        if self.on_done:
+            self.on_done(None if error else self.path)
+
+    # Write bytes start..end from the file to out, waiting for the download to reach them
+    def copy(self, out, start, end):
+        with open(self.path, 'rb') as f:
+            position = start
+            while position <= end:
+                with self.changed:
+                    while self.available <= position and not self.finished:
+                        self.changed.wait()
+                    available = self.available
+                if available <= position:
+                    raise IOError(f"Download stopped at byte {available}: {self.error}")
+                f.seek(position)
+                data = f.read(min(available, end + 1, position + self.buffer_size) - position)
+                out.write(data)
+                position += len(data)
+
+    # Write bytes start..end to out straight from the source
+    def relay(self, out, start, end):
+        with self.session.get(self.source_url, headers={'Range': f'bytes={start}-{end}'}, stream=True,
+                              timeout=settings.DOWNLOAD_TIMEOUT) as r:
+            if r.status_code != 206:
+                raise IOError(f"Server ignored range request ({r.status_code})")
+            for data in r.iter_content(chunk_size=self.buffer_size):
+                out.write(data)
+
+    # Stop serving; cancel=True also stops the download
+    def close(self, cancel=False):
+        self.cancelled = self.cancelled or cancel
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
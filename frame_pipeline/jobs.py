@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import uuid
+import queue
+import bisect
+import threading
+import traceback
+
+from . import settings
+from .checkpoint import MANIFEST_NAME, Checkpoint
+from .workspace import Workspace, check_workspace_id, cleanup_workspaces
+
+
+# In-process stand-in for a message broker: job ids go in with put and come out with
+# get. Any object with the same two methods (backed by Redis, SQS, ...) can replace it.
+class LocalBroker:
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def put(self, job_id):
+        self.queue.put(job_id)
+
+    # Return the next job id, blocking until one is available
+    def get(self):
+        return self.queue.get()
+
+
+# Function to snapshot a job's progress counters with elapsed time and throughput
+def job_stats(job):
+    stats = dict(job["progress"])
+    if job["started"] is not None:
+        elapsed = (job["finished"] or time.time()) - job["started"]
+        stats["elapsed"] = elapsed
+        stats["decoded_fps"] = stats.get("decoded", 0) / elapsed if elapsed else 0.0
+        stats["results_per_second"] = stats.get("results_sent", 0) / elapsed if elapsed else 0.0
+    return stats
+
+
+# Runs pipeline work in the background. submit() returns a job id straight away and a
+# pool of worker threads picks jobs off the broker. A job function is called with a
+# `progress` dict (the pipeline stats: decoded, duplicates, ocr_calls, ...) that it
+# updates as it runs, an `on_result` callback for run_pipeline and its own `workspace`
+# directory for frames and result files. Its return value becomes the job result and
+# goes out with the final status event, so it should be a summary (result file paths
+# and counts), never the result rows themselves.
+# Every job keeps an ordered event log (status changes and each result as it is
+# produced) that events() replays and then follows live. The log holds at most
+# event_log events, dropping the oldest results first, and event_ttl seconds after the
+# job finishes its results are dropped altogether (they are in the job's result files),
+# so finished jobs kept in the history hold no result payloads. Workspaces are deleted
+# workspace_ttl seconds after their job finishes, or when the job leaves the history.
+class JobQueue:
+    def __init__(self, workers=settings.JOB_WORKERS, broker=None, history=settings.JOB_HISTORY,
+                 workspace_root=settings.WORKSPACE_ROOT, workspace_ttl=settings.WORKSPACE_TTL,
+                 event_log=settings.JOB_EVENT_LOG, event_ttl=settings.JOB_EVENT_TTL):
+        self.broker = broker or LocalBroker()
+        self.history = history
+        self.workspace_root = workspace_root
+        self.workspace_ttl = workspace_ttl
+        self.event_log = event_log
+        self.event_ttl = event_ttl
+        cleanup_workspaces(workspace_root, workspace_ttl)
+        self.jobs = {}
+        self.tasks = {}
+        self.event_logs = {}
+        self.event_ids = {}
+        self.workspaces = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.workers = [threading.Thread(target=self.work, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    # Queue func(*args, progress=..., on_result=..., workspace=..., **kwargs) and return its
+    # job id. Passing the job_id of an earlier job runs it again in the same workspace,
+    # so it can pick up from its checkpoint; a job still queued or running can't be resubmitted.
+    # A job_id that is not a workspace id (32 hex digits) raises ValueError.
+    def submit(self, func, *args, job_id=None, **kwargs):
+        job_id = check_workspace_id(job_id or uuid.uuid4().hex)
+        with self.lock:
+            if job_id in self.jobs and self.jobs[job_id]["finished"] is None:
+                raise ValueError("Job is already queued or running.")
+            self.jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "progress": {},
+                "result": None,
+                "error": None,
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+                "workspace": None
+            }
+            self.tasks[job_id] = (func, args, kwargs)
+            self.event_logs[job_id] = []
+            self.event_ids[job_id] = 0
+            self.publish(job_id, "status", {"status": "queued"})
+        self.broker.put(job_id)
+        return job_id
+
+    # Return a snapshot of a job, or None for an unknown id
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return dict(job, progress=job_stats(job))
+
+    # Return the checkpoint in a job's workspace, or None if the job has none (or expired)
+    def checkpoint(self, job_id):
+        try:
+            workspace_path = Workspace(job_id, self.workspace_root, create=False).path
+        except ValueError:
+            return None
+        path = os.path.join(workspace_path, MANIFEST_NAME)
+        return Checkpoint(path) if os.path.exists(path) else None
+
+    # Append an event to a job's log, dropping the oldest result beyond event_log events,
+    # and wake its readers (caller holds the lock)
+    def publish(self, job_id, event, data):
+        log = self.event_logs[job_id]
+        log.append({"id": self.event_ids[job_id], "event": event, "data": data})
+        self.event_ids[job_id] += 1
+        if self.event_log and len(log) > self.event_log:
+            oldest = next((i for i, logged in enumerate(log) if logged["event"] == "result"), None)
+            if oldest is not None:
+                del log[oldest]
+        self.changed.notify_all()
+
+    # Yield a job's events with ids from `since` on, following it until it finishes;
+    # events dropped from the log are skipped. While nothing happens for `interval`
+    # seconds a "progress" event (not logged, id None) carries the current counters.
+    # Unknown jobs yield nothing.
+    def events(self, job_id, since=0, interval=settings.JOB_EVENT_INTERVAL):
+        position = since
+        while True:
+            with self.lock:
+                job = self.jobs.get(job_id)
+                log = self.event_logs.get(job_id)
+                if job is None or log is None:
+                    return
+                if self.event_ids[job_id] <= position and job["finished"] is None:
+                    self.changed.wait(interval)
+                    log = self.event_logs.get(job_id, log)
+                pending = log[bisect.bisect_left(log, position, key=lambda logged: logged["id"]):]
+                position = max(position, self.event_ids.get(job_id, position))
+                finished = job["finished"] is not None
+                heartbeat = None if pending or finished else {"id": None, "event": "progress", "data": job_stats(job)}
+
+            yield from pending
+            if heartbeat:
+                yield heartbeat
+            if finished:
+                return
+
+    # Yield a job's events as text: server-sent events ("sse") or NDJSON lines ("ndjson")
+    def event_stream(self, job_id, since=0, format="sse"):
+        formatter = format_ndjson if format == "ndjson" else format_sse
+        for event in self.events(job_id, since):
+            yield formatter(event)
+
+    # Worker loop: run queued jobs one at a time. Anything a job raises, creating its
+    # workspace included, marks it failed without taking the worker down.
+    def work(self):
+        while True:
+            job_id = self.broker.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+                func, args, kwargs = self.tasks.pop(job_id, (None, (), {}))
+                if job is None or func is None:
+                    continue
+                job.update(status="running", started=time.time())
+                self.publish(job_id, "status", {"status": "running"})
+
+            def on_result(result, stats, job_id=job_id, job=job):
+                with self.lock:
+                    stats["results_sent"] = stats.get("results_sent", 0) + 1
+                    self.publish(job_id, "result", {"result": result, "stats": job_stats(job)})
+
+            try:
+                workspace = Workspace(job_id, self.workspace_root)
+                with self.lock:
+                    self.workspaces[job_id] = workspace
+                    job["workspace"] = workspace.path
+                result = func(*args, progress=job["progress"], on_result=on_result, workspace=workspace, **kwargs)
+                status, error = "done", None
+            except Exception as e:
+                traceback.print_exc()
+                result, status, error = None, "failed", str(e)
+
+            with self.lock:
+                job.update(status=status, result=result, error=error, finished=time.time())
+                self.publish(job_id, status, {"status": status, "result": result, "error": error, "stats": job_stats(job)})
+                self.prune()
+
+    # Delete expired workspaces, drop the result events of jobs finished event_ttl
+    # seconds ago and forget the oldest finished jobs beyond the history limit (caller
+    # holds the lock)
+    def prune(self):
+        finished = sorted((job for job in self.jobs.values() if job["finished"] is not None), key=lambda job: job["finished"])
+        cutoff = time.time() - self.workspace_ttl
+        event_cutoff = time.time() - self.event_ttl
+        for number, job in enumerate(finished):
+            forget = number < len(finished) - self.history
+            if (forget or job["finished"] < cutoff) and job["id"] in self.workspaces:
+                self.workspaces.pop(job["id"]).cleanup()
+                job["workspace"] = None
+            if forget:
+                del self.jobs[job["id"]]
+                del self.event_logs[job["id"]]
+                del self.event_ids[job["id"]]
+            elif job["finished"] < event_cutoff:
+                self.event_logs[job["id"]] = [logged for logged in self.event_logs[job["id"]] if logged["event"] != "result"]
+
+
+# Function to format a job event for a text/event-stream response
+def format_sse(event):
+    lines = [f"id: {event['id']}"] if event["id"] is not None else []
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# Function to format a job event as one line of newline-delimited JSON
+def format_ndjson(event):
+    return json.dumps(event, default=str) + "\n"
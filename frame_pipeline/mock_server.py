@@ -0,0 +1,139 @@
+# Local stand-in for the chat-completions endpoint, used by the benchmarks.
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Chat-completions stand-in: answers every request with server.reply after
+# server.latency seconds (a batch request asking for JSON gets {"frames": [...]} with
+# server.reply for each of its images). Once server.fail_after requests have been answered it drops
+# every further connection without a response, like an endpoint going down mid-job,
+# and while server.unavailable is above zero each request takes one off it and gets a 503.
+# Headers and body go out in separate writes; TCP_NODELAY keeps Nagle's algorithm
+# from holding the body back for the client's delayed ACK on a keep-alive
+# connection, which would add ~40 ms to every pooled request.
+class MockOCRHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        with self.server.lock:
+            self.server.requests += 1
+            failing = self.server.fail_after is not None and self.server.requests > self.server.fail_after
+            unavailable = not failing and self.server.unavailable > 0
+            if unavailable:
+                self.server.unavailable -= 1
+        if failing:
+            self.close_connection = True
+            return
+        if unavailable:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        content = self.server.reply
+        if payload.get("response_format", {}).get("type") == "json_object":
+            images = sum(1 for message in payload["messages"] for part in message["content"]
+                         if part.get("type") == "image_url")
+            content = json.dumps({"frames": [self.server.reply] * images})
+        body = json.dumps({"choices": [{"message": {"content": content}}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to start the mock server on a free local port; returns (server, url)
+def start_mock_server(reply="mock text", latency=0.0, handler=MockOCRHandler, fail_after=None):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.reply = reply
+    server.latency = latency
+    server.fail_after = fail_after
+    server.unavailable = 0
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+# Stand-in for blob storage: serves server.payload with HEAD, ETag and single Range
+# requests, sleeping server.latency per response and capping each response to
+# server.bandwidth bytes/second (0 = unlimited) to mimic a per-connection limit.
+# GETs are counted in server.requests; while server.unavailable is above zero each
+# range request takes one off it and gets a 503.
+class MockBlobHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def send_payload_headers(self, status, start, end):
+        self.send_response(status)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.server.payload)}")
+        # FFmpeg asks for Connection: close, but reuses the connection unless the reply says so
+        if self.headers.get('Connection', '').lower() == 'close':
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.send_payload_headers(200, 0, len(self.server.payload) - 1)
+
+    def do_GET(self):
+        payload = self.server.payload
+        start, end, status = 0, len(payload) - 1, 200
+        header = self.headers.get('Range')
+        with self.server.lock:
+            self.server.requests += 1
+            unavailable = header is not None and self.server.unavailable > 0
+            if unavailable:
+                self.server.unavailable -= 1
+        if unavailable:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if header and header.startswith('bytes=') and self.headers.get('If-Range', self.server.etag) == self.server.etag:
+            first, _, last = header[len('bytes='):].partition('-')
+            start, end, status = int(first), min(int(last or end), end), 206
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        self.send_payload_headers(status, start, end)
+        block = 256 * 1024
+        for offset in range(start, end + 1, block):
+            data = payload[offset:min(offset + block, end + 1)]
+            self.wfile.write(data)
+            if self.server.bandwidth:
+                time.sleep(len(data) / self.server.bandwidth)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to start the blob stand-in serving payload; returns (server, url)
+def start_mock_blob_server(payload, latency=0.0, bandwidth=0):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockBlobHandler)
+    server.daemon_threads = True
+    server.payload = payload
+    server.etag = f'"{len(payload)}-{hash(payload[:1024])}"'
+    server.latency = latency
+    server.bandwidth = bandwidth
+    server.unavailable = 0
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/videos/mock.mp4"
@@ -0,0 +1,211 @@
+import time
+import base64
+import cv2
+
+from . import settings
+from .cache import default_cache
+from .backends import get_backend
+from .dedup import frame_key
+from .dispatch import RateLimiter, dispatch_ordered
+from .prepare import ImagePreparer
+from .retry import CircuitOpenError
+
+
+# Function to encode the image
+def encode_image(image_path):
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+
+# Function to encode a decoded frame to JPEG bytes in memory, optionally
+# shrinking it so its longest side is at most max_side pixels
+def encode_frame(image, quality=settings.JPEG_QUALITY, max_side=settings.MAX_SIDE):
+    if max_side:
+        height, width = image.shape[:2]
+        scale = max_side / max(height, width)
+        if scale < 1:
+            image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("Could not encode frame as JPEG")
+    return buffer.tobytes()
+
+
+# Function to extract text from JPEG bytes with an OCR backend (name or object,
+# default settings.OCR_BACKEND)
+def extract_text_from_bytes(jpeg_bytes, prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL, backend=None):
+    return get_backend(backend).extract_texts([jpeg_bytes], prompt, model)[0]
+
+
+# Function to extract text from an image file with an OCR backend
+def extract_text_from_image(image_path, prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL, backend=None):
+    with open(image_path, "rb") as image_file:
+        return extract_text_from_bytes(image_file.read(), prompt, model, backend)
+
+
+# Stage that encodes each frame once, as frame["jpeg"]. With a max_bytes budget the
+# payload is prepared by an ImagePreparer (resolution, quality, grayscale and
+# image_format picked to fit the budget, see prepare.py) and the frame is marked
+# "prepared"; without one it is a JPEG at the given quality and max_side.
+# max_short_side=None keeps the resolution for local OCR backends.
+def encode_stage(quality=settings.JPEG_QUALITY, max_side=settings.MAX_SIDE, max_bytes=settings.OCR_IMAGE_MAX_BYTES,
+                 image_format=settings.OCR_IMAGE_FORMAT, grayscale=settings.OCR_IMAGE_GRAYSCALE,
+                 max_short_side=settings.OCR_IMAGE_MAX_SHORT_SIDE):
+    preparer = None
+    if max_bytes:
+        preparer = ImagePreparer(max_bytes, image_format, grayscale, quality, max_side=max_side,
+                                 max_short_side=max_short_side)
+
+    def stage(frames, stats):
+        for frame in frames:
+            if preparer is None:
+                frame["jpeg"] = encode_frame(frame["image"], quality, max_side)
+            else:
+                frame["jpeg"] = preparer.prepare(frame["image"])
+                frame["prepared"] = True
+                if len(frame["jpeg"]) > max_bytes:
+                    stats['over_budget'] = stats.get('over_budget', 0) + 1
+            stats['encoded_bytes'] = stats.get('encoded_bytes', 0) + len(frame["jpeg"])
+            yield frame
+    return stage
+
+
+# Function to tell whether an OCR result is one of the client's error strings
+def is_error_text(text):
+    return text.startswith("Error:")
+
+
+# Function to tell whether a pipeline result holds an OCR error, for the frame or any region
+def has_error_text(result):
+    texts = [result.get("extracted_text") or ""] + list((result.get("roi_texts") or {}).values())
+    return any(is_error_text(text) for text in texts)
+
+
+# Function to describe a frame whose OCR failed, with enough to find it again
+def dead_letter(frame):
+    record = {"index": frame["index"], "timestamp": frame["timestamp"], "error": frame["extracted_text"]}
+    if "region" in frame:
+        record["region"] = frame["region"]
+    if "prompt" in frame:
+        record["prompt"] = frame["prompt"]
+    return record
+
+
+# Function to group frames into OCR batches of at most batch_size frames whose
+# base64 payload stays under max_bytes; a lone oversized frame is its own batch.
+# With regions, the region records of one frame (see roi.split_rois) are kept in one
+# batch past batch_size, and a batch may mix prompts (each image is sent with its
+# own); without, frames carrying their own frame["prompt"] are only batched with the
+# same prompt.
+def batch_frames(frames, batch_size=settings.OCR_BATCH_SIZE, max_bytes=settings.OCR_BATCH_MAX_BYTES,
+                 regions=settings.OCR_BATCH_REGIONS):
+    batch = []
+    batch_bytes = 0
+    for frame in frames:
+        frame_bytes = (len(frame["jpeg"]) + 2) // 3 * 4
+        same_frame = (regions and batch and "region" in frame and "region" in batch[-1]
+                      and frame["index"] == batch[-1]["index"])
+        if batch and ((len(batch) >= batch_size and not same_frame) or batch_bytes + frame_bytes > max_bytes
+                      or (not regions and frame.get("prompt") != batch[0].get("prompt"))):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(frame)
+        batch_bytes += frame_bytes
+    if batch:
+        yield batch
+
+
+# Stage that runs OCR on the in-memory JPEG of every frame that reaches it.
+# Up to `concurrency` requests are in flight at once and results keep frame order;
+# requests_per_minute / tokens_per_minute throttle the dispatcher to the API limits.
+# With a cache (True = the shared default_cache()), frames whose content key
+# (dedup.frame_key), prompt and model were seen before are answered locally and never sent.
+# batch_size > 1 packs up to that many frames (within OCR_BATCH_MAX_BYTES) into one request.
+# A frame["prompt"] (e.g. set per region by roi.split_rois) overrides prompt; with
+# batch_regions the regions of a frame share one request, one prompt per image.
+# backend is an OCR backend name or object (see backends.py); local backends get at
+# least one request in flight per worker process.
+# A failed OCR call (after the client's own retries) does not stop the run: the frame
+# keeps an "Error: ..." text and, given a dead_letters list, is recorded there
+# (see dead_letter) so it can be reprocessed later. While the endpoint's circuit
+# breaker is open, calls wait for its trial requests; CircuitOpenError, raised once
+# the endpoint has stayed down across OCR_BREAKER_TRIALS reset periods, does stop the
+# run: failing every remaining frame in milliseconds would only turn the rest of the
+# video into dead letters, while a failed run is picked up again from its checkpoint.
+def ocr_stage(prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL, concurrency=settings.OCR_CONCURRENCY,
+              requests_per_minute=settings.OCR_REQUESTS_PER_MINUTE, tokens_per_minute=settings.OCR_TOKENS_PER_MINUTE,
+              backend=None, cache=None, batch_size=settings.OCR_BATCH_SIZE, dead_letters=None,
+              batch_regions=settings.OCR_BATCH_REGIONS):
+    backend = get_backend(backend)
+    concurrency = max(concurrency, getattr(backend, "workers", 1))
+    # Results of different backends are cached apart
+    cache_model = model if backend.name == "openai" else f"{backend.name}:{model}"
+    limiter = None
+    if backend.name != "tesseract" and (requests_per_minute or tokens_per_minute):
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    if cache is True:
+        cache = default_cache()
+    elif not cache:
+        cache = None
+
+    # OCR one batch; returns one (extracted_text, cache_hit, latency in seconds) per frame
+    def call(batch):
+        prompts = [frame.get("prompt", prompt) for frame in batch]
+        texts = [None] * len(batch)
+        if cache is not None:
+            texts = [cache.get(frame["key"], frame_prompt, cache_model) for frame, frame_prompt in zip(batch, prompts)]
+        misses = [i for i, text in enumerate(texts) if text is None]
+
+        latency = 0.0
+        if misses:
+            if limiter is not None:
+                limiter.acquire(settings.OCR_TOKENS_PER_IMAGE * len(misses))
+            jpeg_list = [batch[i]["jpeg"] for i in misses]
+            # One prompt for the request, or a list of one per image when they differ
+            request_prompt = [prompts[i] for i in misses]
+            if len(set(request_prompt)) == 1:
+                request_prompt = request_prompt[0]
+            start = time.perf_counter()
+            try:
+                extracted = backend.extract_texts(jpeg_list, request_prompt, model)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                print(f"Error: OCR request failed: {e}")
+                extracted = [f"Error: {e}"] * len(jpeg_list)
+            latency = time.perf_counter() - start
+            for i, extracted_text in zip(misses, extracted):
+                texts[i] = extracted_text
+                if cache is not None and not is_error_text(extracted_text):
+                    cache.put(batch[i]["key"], prompts[i], cache_model, extracted_text)
+
+        missed = set(misses)
+        return [(text, i not in missed, latency if i in missed else 0.0) for i, text in enumerate(texts)]
+
+    def keyed(frames):
+        for frame in frames:
+            if cache is not None:
+                frame["key"] = frame_key(frame)
+            yield frame
+
+    def stage(frames, stats):
+        batches = batch_frames(keyed(frames), max(1, batch_size), regions=batch_regions)
+        for batch, results in dispatch_ordered(batches, call, max(1, concurrency)):
+            if not all(cache_hit for _, cache_hit, _ in results):
+                stats['ocr_requests'] = stats.get('ocr_requests', 0) + 1
+            for frame, (extracted_text, cache_hit, latency) in zip(batch, results):
+                frame["extracted_text"] = extracted_text
+                frame["ocr_latency"] = latency
+                if cache_hit:
+                    stats['ocr_cache_hits'] = stats.get('ocr_cache_hits', 0) + 1
+                else:
+                    stats['ocr_calls'] = stats.get('ocr_calls', 0) + 1
+                if is_error_text(extracted_text):
+                    stats['dead_letters'] = stats.get('dead_letters', 0) + 1
+                    if dead_letters is not None:
+                        dead_letters.append(dead_letter(frame))
+                print(f"Frame: {frame['index']}{' ' + frame['region'] if 'region' in frame else ''}, "
+                      f"Extracted Text: {frame['extracted_text']}")
+                yield frame
+    return stage
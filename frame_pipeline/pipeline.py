@@ -0,0 +1,142 @@
+from . import settings
+from .decode import iter_frames, iter_frames_parallel
+from .dedup import dedup_stage
+from .ocr import encode_stage, ocr_stage
+from .prefilter import text_prefilter
+from .roi import get_layout, split_rois, merge_rois, roi_change_stage
+from .ticker import ticker_box, ticker_stage
+from .sinks import save_frames
+
+# Keys of a frame record that are copied into the returned results
+RESULT_KEYS = ("image_name", "extracted_text", "index", "timestamp", "end_timestamp", "region", "hash", "roi_texts",
+               "ocr_latency")
+
+
+# Function to push decoded frames through a list of stages and collect results.
+# on_result(result, stats) is called for each result as soon as it is produced;
+# with collect=False results are only passed to on_result (e.g. a ParquetResultSink)
+# and not kept in memory, and the returned list is empty.
+def run_pipeline(frames, stages, stats=None, on_result=None, collect=True):
+    stats = stats if stats is not None else {}
+    for stage in stages:
+        frames = stage(frames, stats)
+
+    results = []
+    count = 0
+    for frame in frames:
+        result = {key: frame[key] for key in RESULT_KEYS if key in frame}
+        count += 1
+        if collect:
+            results.append(result)
+        if on_result:
+            on_result(result, stats)
+
+    stats['results'] = count
+    return results
+
+
+# Function to open the frame source: sequential, or segment-parallel when workers > 1
+def open_frames(video_path, stats, sample=None, workers=None):
+    if workers and workers > 1:
+        return iter_frames_parallel(video_path, stats, workers, **(sample or {}))
+    return iter_frames(video_path, stats, **(sample or {}))
+
+
+# Function to build the default stage list: dedup -> text filter -> encode -> OCR -> save.
+# dedup is False, True (blockdiff, which keeps every frame whose overlay text changed)
+# or a method name accepted by dedup_stage; dedup_threshold=None is the method's default.
+# Frames are JPEG-encoded once in memory; saving them to disk is an optional side sink.
+# rois (a channel name or a region layout) OCRs each region of interest on its own
+# instead of the whole frame, filling frame["roi_texts"].
+# ticker (a channel name, or True for the default layout) stitches the scrolling ticker
+# band into a panorama and OCRs one segment per scroll cycle instead of every frame.
+# text_filter (True, or a threshold; default settings.TEXT_PREFILTER) drops frames with no text-like regions before OCR;
+# it only applies when ocr is on.
+# text_change (with rois) only OCRs a frame when one of its regions changed; pair it
+# with roi.text_ranges to get "text shown from .. to .." rows instead of one per frame.
+# ocr_backend picks the OCR backend ("openai", "tesseract", "hybrid"); ticker segments
+# default to settings.TICKER_OCR_BACKEND, everything else to settings.OCR_BACKEND.
+# workspace (a Workspace) charges saved frames against its quota.
+# dead_letters (a list) collects the frames whose OCR failed, see ocr.dead_letter.
+# image_max_bytes / roi_max_bytes are the OCR payload budgets for whole frames and for
+# region crops / ticker strips (0 = fixed jpeg_quality), prepared as image_format with
+# grayscale ("auto", True, False), see prepare.py.
+def default_stages(output_folder, prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL, dedup=False, ocr=True,
+                   dedup_threshold=None, save=True, jpeg_quality=settings.JPEG_QUALITY,
+                   max_side=settings.MAX_SIDE, ocr_concurrency=settings.OCR_CONCURRENCY, ocr_cache=True,
+                   ocr_batch_size=settings.OCR_BATCH_SIZE, rois=None, ticker=None,
+                   ocr_backend=None, text_filter=settings.TEXT_PREFILTER,
+                   text_change=False, workspace=None, dead_letters=None,
+                   image_max_bytes=settings.OCR_IMAGE_MAX_BYTES, roi_max_bytes=settings.OCR_ROI_MAX_BYTES,
+                   image_format=settings.OCR_IMAGE_FORMAT, grayscale=settings.OCR_IMAGE_GRAYSCALE):
+    stages = []
+    # Only the remote API scales images down to its own size; local OCR keeps the resolution
+    remote = getattr(ocr_backend, "name", ocr_backend or settings.OCR_BACKEND) == "openai"
+    max_short_side = settings.OCR_IMAGE_MAX_SHORT_SIDE if remote else None
+    if dedup:
+        stages.append(dedup_stage("blockdiff" if dedup is True else dedup, dedup_threshold))
+    # The ticker needs every frame and text ranges need frames where the text vanishes;
+    # without OCR the filter has nothing to save and would only drop frames to be saved
+    if ocr and text_filter and not ticker and not (rois and text_change):
+        stages.append(text_prefilter() if text_filter is True else text_prefilter(text_filter))
+    if ocr and ticker:
+        stages.append(ticker_stage(ticker_box(None if ticker is True else ticker), quality=jpeg_quality,
+                                   max_bytes=roi_max_bytes, image_format=image_format, grayscale=grayscale))
+        stages.append(ocr_stage(prompt, model, ocr_concurrency, backend=ocr_backend or settings.TICKER_OCR_BACKEND,
+                                cache=ocr_cache, batch_size=ocr_batch_size, dead_letters=dead_letters))
+    elif ocr and rois:
+        layout = get_layout(rois) if isinstance(rois, str) else rois
+        if text_change:
+            stages.append(roi_change_stage(layout, dedup_threshold))
+        stages.append(split_rois(layout, jpeg_quality, max_bytes=roi_max_bytes, image_format=image_format,
+                                 grayscale=grayscale, max_short_side=max_short_side))
+        stages.append(ocr_stage(prompt, model, ocr_concurrency, backend=ocr_backend, cache=ocr_cache,
+                                batch_size=ocr_batch_size, dead_letters=dead_letters))
+        stages.append(merge_rois())
+    else:
+        if ocr or save:
+            # Frames encoded only to be saved keep their full quality
+            stages.append(encode_stage(jpeg_quality, max_side, image_max_bytes if ocr else 0, image_format,
+                                       grayscale, max_short_side))
+        if ocr:
+            stages.append(ocr_stage(prompt, model, ocr_concurrency, backend=ocr_backend, cache=ocr_cache,
+                                batch_size=ocr_batch_size, dead_letters=dead_letters))
+    if save:
+        stages.append(save_frames(output_folder, workspace))
+    return stages
+
+
+# Function to extract frames from video, optionally dedup them, and OCR them.
+# sample holds iter_frames sampling options, e.g. {"target_fps": 5};
+# workers > 1 decodes the video in that many processes (default settings.DECODE_WORKERS);
+# on_result(result, stats) sees each result while the video is still being processed,
+# and collect=False leaves the results to it instead of returning them;
+# stage_options are passed to default_stages (dedup, ocr, save, ...).
+def extract_frames(video_path, output_folder=settings.OUTPUT_FOLDER, prompt=settings.DEFAULT_PROMPT,
+                   model=settings.DEFAULT_MODEL, stats=None, sample=None, workers=settings.DECODE_WORKERS,
+                   on_result=None, collect=True, **stage_options):
+    stats = stats if stats is not None else {}
+    stages = default_stages(output_folder, prompt, model, **stage_options)
+    results = run_pipeline(open_frames(video_path, stats, sample, workers), stages, stats, on_result, collect)
+
+    print(f"Unique frames extracted: {stats['results']}")
+    skipped = " (skipped OCR)" if stage_options.get("ocr", True) else ""
+    print(f"Number of Duplicate frames: {stats.get('duplicates', 0)}{skipped}")
+    if 'no_text_skipped' in stats:
+        print(f"Frames without text: {stats['no_text_skipped']} (skipped OCR)")
+    if 'dead_letters' in stats:
+        print(f"Frames whose OCR failed: {stats['dead_letters']} (dead-lettered)")
+    return results
+
+
+# Function to retry the OCR of dead-lettered frames: decodes only their timestamps
+# and runs them through the pipeline again, without dedup or the text prefilter.
+# Frames that fail again land in a new dead_letters list passed in stage_options.
+def reprocess_dead_letters(video_path, records, output_folder=settings.OUTPUT_FOLDER,
+                           prompt=settings.DEFAULT_PROMPT, model=settings.DEFAULT_MODEL, stats=None, **stage_options):
+    timestamps = sorted({record["timestamp"] for record in records})
+    if not timestamps:
+        return []
+    stage_options.setdefault("text_filter", False)
+    return extract_frames(video_path, output_folder, prompt, model, stats, sample={"timestamps": timestamps},
+                          dedup=False, **stage_options)
@@ -0,0 +1,49 @@
+import cv2
+
+from . import settings
+
+# Size the frame is shrunk to before looking for text
+PREFILTER_SIZE = (480, 270)
+
+# Structuring elements: gradient picks up glyph edges, the wide close joins glyphs into words
+_GRADIENT_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+_CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1))
+
+
+# Function to score how much of a frame looks like text: the fraction of a downscaled
+# frame covered by wide, short, dense blobs of strong gradient (words and lines of text)
+def text_score(image, size=PREFILTER_SIZE):
+    small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, _GRADIENT_KERNEL)
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, _CLOSE_KERNEL)
+
+    count, _, components, _ = cv2.connectedComponentsWithStats(closed, connectivity=8)
+    components = components[1:]
+    widths = components[:, cv2.CC_STAT_WIDTH]
+    heights = components[:, cv2.CC_STAT_HEIGHT]
+    areas = components[:, cv2.CC_STAT_AREA]
+
+    text_like = (
+        (widths >= 2 * heights)
+        & (heights >= 5)
+        & (heights <= size[1] // 4)
+        & (areas >= 0.45 * widths * heights)
+    )
+    return float(areas[text_like].sum()) / (size[0] * size[1])
+
+
+# Stage that drops frames with no text-like regions before they are encoded and OCR'd.
+# Frames scoring below threshold are skipped and counted in stats['no_text_skipped'].
+def text_prefilter(threshold=settings.TEXT_PREFILTER_THRESHOLD):
+    def stage(frames, stats):
+        for frame in frames:
+            frame["text_score"] = text_score(frame["image"])
+            if frame["text_score"] >= threshold:
+                yield frame
+            else:
+                stats['no_text_skipped'] = stats.get('no_text_skipped', 0) + 1
+    return stage
@@ -0,0 +1,164 @@
+import math
+import numpy as np
+import cv2
+
+from . import settings
+
+# Encoders for the OCR payload formats and their quality flags
+FORMATS = {
+    "jpeg": ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    "webp": ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+# A remembered setting is reused as-is while its payload fills at least this much of
+# the budget; below that the frame got simpler and a better setting may fit
+HINT_FILL = 0.7
+
+# Grayscale edge energy, relative to the strongest colour channel, above which the
+# text is told apart by brightness and colour can be dropped
+GRAY_EDGE_RATIO = 0.6
+
+
+# Function to encode an image (BGR or grayscale) as JPEG or WebP bytes
+def encode_image_bytes(image, image_format="jpeg", quality=settings.JPEG_QUALITY):
+    extension, flag = FORMATS[image_format]
+    ok, buffer = cv2.imencode(extension, image, [flag, int(quality)])
+    if not ok:
+        raise ValueError(f"Could not encode image as {image_format}")
+    return buffer.tobytes()
+
+
+# Function to tell the MIME type of an encoded payload from its magic bytes
+def image_mime(data):
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "image/webp"
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return "image/png"
+    return "image/jpeg"
+
+
+# Function to tell whether a BGR image can go grayscale without losing its text:
+# compares the edge energy left in the grayscale image with the strongest colour
+# channel, on a quarter-size copy. Text set apart from its background by hue only
+# (red on green of the same brightness) loses its edges in grayscale.
+def colour_matters(image):
+    if image.ndim < 3:
+        return False
+    small = cv2.resize(image, (max(1, image.shape[1] // 4), max(1, image.shape[0] // 4)), interpolation=cv2.INTER_AREA)
+
+    def edge_energy(channel):
+        return float(np.mean(np.abs(cv2.Laplacian(channel, cv2.CV_32F))))
+
+    channels = max(edge_energy(small[:, :, c]) for c in range(3))
+    return channels > 0 and edge_energy(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)) < GRAY_EDGE_RATIO * channels
+
+
+# Picks resolution, quality and grayscale for each OCR image so its payload stays
+# under max_bytes while keeping as much detail as possible. Per resolution, from the
+# largest allowed down, it tries: colour at full quality, grayscale at full quality
+# (when allowed), then the highest quality from min_quality up that fits. Resolution
+# is capped by max_side (longest side) and max_short_side (the chat-completions API
+# scales high-detail images to 768 px on the short side, so more is never read) and
+# never goes below min_scale of the source or min_short_side pixels, so small text
+# stays readable; an image that cannot fit at that floor is sent at the floor.
+# The setting found for one image is tried first for the next one of the same size,
+# so steady video content costs one encode per frame instead of a search.
+class ImagePreparer:
+    def __init__(self, max_bytes=settings.OCR_IMAGE_MAX_BYTES, image_format=settings.OCR_IMAGE_FORMAT,
+                 grayscale=settings.OCR_IMAGE_GRAYSCALE, quality=settings.JPEG_QUALITY,
+                 min_quality=settings.OCR_IMAGE_MIN_QUALITY, max_side=settings.MAX_SIDE,
+                 max_short_side=settings.OCR_IMAGE_MAX_SHORT_SIDE, min_scale=settings.OCR_IMAGE_MIN_SCALE,
+                 min_short_side=settings.OCR_IMAGE_MIN_SHORT_SIDE):
+        if image_format not in FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+        self.grayscale = grayscale
+        self.quality = quality
+        self.min_quality = min(min_quality, quality)
+        self.max_side = max_side
+        self.max_short_side = max_short_side
+        self.min_scale = min_scale
+        self.min_short_side = min_short_side
+        self.hints = {}
+
+    # Scale of the largest and smallest resolution allowed for an image of this size
+    def scale_range(self, height, width):
+        scale = 1.0
+        if self.max_side:
+            scale = min(scale, self.max_side / max(height, width))
+        if self.max_short_side:
+            scale = min(scale, self.max_short_side / min(height, width))
+        floor = max(self.min_scale, self.min_short_side / min(height, width))
+        return scale, min(scale, floor)
+
+    def encode(self, image, quality):
+        return encode_image_bytes(image, self.image_format, quality)
+
+    # Render the image at a setting: (scale, grayscale)
+    def render(self, image, scale, gray):
+        if scale < 1:
+            height, width = image.shape[:2]
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        if gray and image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    # Highest quality in [min_quality, top) whose payload fits, as (quality, bytes),
+    # or (None, smallest payload) when even min_quality is too big
+    def search_quality(self, image, top):
+        smallest = self.encode(image, self.min_quality)
+        if len(smallest) > self.max_bytes:
+            return None, smallest
+        low, high, best = self.min_quality, top - 1, (self.min_quality, smallest)
+        while low < high:
+            middle = (low + high + 1) // 2
+            data = self.encode(image, middle)
+            if len(data) <= self.max_bytes:
+                low, best = middle, (middle, data)
+            else:
+                high = middle - 1
+        return best
+
+    # Encode one image within the budget; key separates images whose settings should be
+    # remembered apart (e.g. one key per region). Returns the payload bytes.
+    def prepare(self, image, key=None):
+        height, width = image.shape[:2]
+        scale, min_scale = self.scale_range(height, width)
+        if not self.max_bytes:
+            return self.encode(self.render(image, scale, self.grayscale is True), self.quality)
+
+        hint_key = (key, height, width)
+        hint = self.hints.get(hint_key)
+        if hint is not None:
+            data = self.encode(self.render(image, hint[0], hint[1]), hint[2])
+            # The best setting there is needs no better one to be looked for
+            best = hint[0] == scale and hint[2] == self.quality and hint[1] == (self.grayscale is True)
+            if len(data) <= self.max_bytes and (best or len(data) >= HINT_FILL * self.max_bytes):
+                return data
+
+        if self.grayscale == "auto":
+            options = [False] if colour_matters(image) else [False, True]
+        else:
+            options = [bool(self.grayscale)]
+
+        while True:
+            rendered = None
+            for gray in options:
+                rendered = self.render(image, scale, gray)
+                data = self.encode(rendered, self.quality)
+                if len(data) <= self.max_bytes:
+                    self.hints[hint_key] = (scale, gray, self.quality)
+                    return data
+            quality, data = self.search_quality(rendered, self.quality)
+            if quality is not None:
+                self.hints[hint_key] = (scale, options[-1], quality)
+                return data
+            if scale <= min_scale:
+                self.hints[hint_key] = (scale, options[-1], self.min_quality)
+                return data
+            # Payload size goes roughly with the pixel count: jump to the scale that
+            # should fit instead of stepping down one notch at a time
+            step = math.sqrt(self.max_bytes / len(data)) * 0.95
+            scale = max(min_scale, scale * min(0.9, max(0.5, step)))
@@ -0,0 +1,127 @@
+import time
+import random
+import threading
+import email.utils
+
+from . import settings
+
+# Reply statuses worth retrying: rate limited, or a transient server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+# Function to pick the wait before retry number `attempt` (0-based): "full jitter"
+# exponential backoff, so many workers retrying together spread out instead of
+# hitting the endpoint in lockstep. A Retry-After from the server is honoured as the
+# minimum wait.
+def backoff_delay(attempt, base=settings.OCR_BACKOFF_BASE, maximum=settings.OCR_BACKOFF_MAX, retry_after=None):
+    delay = random.uniform(0, min(maximum, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+# Function to read a Retry-After header (seconds or HTTP date) as seconds, or None
+def retry_after_seconds(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Circuit breaker for one endpoint. A request counts once, when it has succeeded or
+# used up its retries; after `failures` failed requests in a row the circuit opens.
+# While it is open callers wait in wait() instead of piling onto a dead endpoint:
+# every `reset` seconds one caller gets a trial request (half-open) while the rest
+# wait for its outcome. A successful trial closes the circuit and releases them; a
+# failed one opens it for another period. Once `trials` trials in a row have failed
+# the endpoint is taken to be down and the waiting callers get CircuitOpenError.
+class CircuitBreaker:
+    def __init__(self, failures=settings.OCR_BREAKER_FAILURES, reset=settings.OCR_BREAKER_RESET,
+                 trials=settings.OCR_BREAKER_TRIALS):
+        self.failures = failures
+        self.reset = reset
+        self.trials = trials
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.consecutive = 0
+        self.opened_at = None
+        # Thread running the half-open trial, failed trials in a row, and the number of
+        # times the breaker has given up (waiters compare it to see they were failed)
+        self.trial = None
+        self.failed_trials = 0
+        self.given_up = 0
+
+    # Block until a request may be sent: at once while the circuit is closed, else until
+    # this caller gets the trial or another caller's trial closes the circuit
+    def wait(self):
+        with self.changed:
+            given_up = self.given_up
+            while self.opened_at is not None:
+                if self.given_up != given_up:
+                    raise CircuitOpenError(f"Endpoint still down after {self.trials} trial requests "
+                                           f"{self.reset:g} s apart")
+                if self.trial is None:
+                    remaining = self.opened_at + self.reset - time.monotonic()
+                    if remaining <= 0:
+                        self.trial = threading.get_ident()
+                        return
+                    self.changed.wait(remaining)
+                else:
+                    self.changed.wait()
+
+    def record_success(self):
+        with self.changed:
+            self.consecutive = 0
+            self.failed_trials = 0
+            self.opened_at = None
+            self.trial = None
+            self.changed.notify_all()
+
+    def record_failure(self):
+        with self.changed:
+            self.consecutive += 1
+            if self.trial == threading.get_ident():
+                self.trial = None
+                self.failed_trials += 1
+                if self.trials and self.failed_trials >= self.trials:
+                    self.failed_trials = 0
+                    self.given_up += 1
+                self.opened_at = time.monotonic()
+            elif self.opened_at is None and self.failures and self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+            self.changed.notify_all()
+
+    # Give the trial back without an outcome (the request never reached the endpoint),
+    # so the next waiter takes it
+    def release(self):
+        with self.changed:
+            if self.trial == threading.get_ident():
+                self.trial = None
+                self.changed.notify_all()
+
+    @property
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+# Function to get the circuit breaker shared by every client of an endpoint URL
+def circuit_breaker(endpoint):
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker()
+        return _breakers[endpoint]
@@ -0,0 +1,179 @@
+import os
+import json
+
+from . import settings
+from .dedup import block_signature, block_distance, content_key, BLOCK_THRESHOLD
+from .ocr import encode_frame
+from .prepare import ImagePreparer
+
+# Region prompts: each region is OCR'd on its own, so the reply needs no parsing
+REGION_TEXT_PROMPT = "Extract the text from the image. Reply with the text only, or nothing if there is no text."
+REGION_LOGO_PROMPT = "Name the TV channel whose logo is shown in the image. Reply with the name only."
+
+# Region layouts per channel. Boxes are fractions of the frame: x, y, width, height.
+# A region may override the crop's max_side and, for its OCR payload, max_bytes,
+# grayscale and format (see prepare.ImagePreparer); the logo keeps its colours.
+DEFAULT_LAYOUTS = {
+    "default": [
+        {"name": "ticker", "box": [0.0, 0.86, 1.0, 0.14], "prompt": REGION_TEXT_PROMPT},
+        {"name": "headline", "box": [0.0, 0.70, 1.0, 0.16], "prompt": REGION_TEXT_PROMPT},
+        {"name": "top", "box": [0.0, 0.0, 0.80, 0.14], "prompt": REGION_TEXT_PROMPT},
+        {"name": "logo", "box": [0.80, 0.0, 0.20, 0.16], "prompt": REGION_LOGO_PROMPT, "max_side": 256,
+         "max_bytes": 16 * 1024, "grayscale": False},
+    ]
+}
+
+# CSV column for each region of the default layout, in the order the scrolling endpoints write them
+ROI_CSV_COLUMNS = [
+    ("ticker", "Bottom_of_the_image"),
+    ("headline", "Middle_of_the_image"),
+    ("top", "Top_of_the_image"),
+    ("logo", "TV_channel_name"),
+]
+
+
+# Function to load channel layouts: DEFAULT_LAYOUTS overridden by the JSON file at path, if any
+def load_layouts(path=settings.ROI_LAYOUTS_PATH):
+    layouts = dict(DEFAULT_LAYOUTS)
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            layouts.update(json.load(f))
+    return layouts
+
+
+# Function to get the region layout for a channel, falling back to the default layout
+def get_layout(channel=None, layouts=None):
+    layouts = layouts if layouts is not None else load_layouts()
+    return layouts.get(channel or "default", layouts["default"])
+
+
+# Function to crop one region (fractional box) out of a frame
+def crop_region(image, box):
+    height, width = image.shape[:2]
+    x, y, w, h = box
+    left, top = int(x * width), int(y * height)
+    right, bottom = min(width, int((x + w) * width)), min(height, int((y + h) * height))
+    return image[top:bottom, left:right]
+
+
+# Stage that replaces each frame with one record per layout region, each holding
+# the cropped, downsized payload of that region and its own prompt. With a max_bytes
+# budget (or a region's own) each region gets an ImagePreparer of its own, so the
+# resolution and quality it settles on are kept per region.
+def split_rois(layout, quality=settings.JPEG_QUALITY, max_side=settings.ROI_MAX_SIDE,
+               max_bytes=settings.OCR_ROI_MAX_BYTES, image_format=settings.OCR_IMAGE_FORMAT,
+               grayscale=settings.OCR_IMAGE_GRAYSCALE, max_short_side=settings.OCR_IMAGE_MAX_SHORT_SIDE):
+    preparers = {}
+    for region in layout:
+        region_bytes = region.get("max_bytes", max_bytes)
+        if region_bytes:
+            preparers[region["name"]] = ImagePreparer(region_bytes, region.get("format", image_format),
+                                                      region.get("grayscale", grayscale), quality,
+                                                      max_side=region.get("max_side", max_side),
+                                                      max_short_side=max_short_side)
+
+    # Encode one region crop for OCR
+    def encode_region(region, crop):
+        if region["name"] in preparers:
+            return preparers[region["name"]].prepare(crop)
+        return encode_frame(crop, quality, region.get("max_side", max_side))
+
+    def stage(frames, stats):
+        for frame in frames:
+            frame["roi_texts"] = {}
+            crops = [(region, crop_region(frame["image"], region["box"])) for region in layout]
+            crops = [(region, crop) for region, crop in crops if crop.size]
+            for position, (region, crop) in enumerate(crops):
+                record = {
+                    "index": frame["index"],
+                    "timestamp": frame["timestamp"],
+                    "region": region["name"],
+                    "image": crop,
+                    "jpeg": encode_region(region, crop),
+                    "prompt": region.get("prompt", REGION_TEXT_PROMPT),
+                    "frame": frame,
+                    "last_region": position == len(crops) - 1,
+                }
+                # Regions that did not change since they were last OCR'd keep the
+                # cache key of that crop, so the OCR cache answers them without a request
+                if region["name"] in frame.get("roi_keys", {}):
+                    record["key"] = frame["roi_keys"][region["name"]]
+                stats['encoded_bytes'] = stats.get('encoded_bytes', 0) + len(record["jpeg"])
+                yield record
+    return stage
+
+
+# Stage that folds region records back into their frames as frame["roi_texts"]
+# ({region name: text}) with the regions' OCR latency summed; frames come out in
+# order once their last region arrives
+def merge_rois():
+    def stage(records, stats):
+        for record in records:
+            frame = record["frame"]
+            frame["roi_texts"][record["region"]] = record.get("extracted_text", "")
+            frame["ocr_latency"] = frame.get("ocr_latency", 0.0) + record.get("ocr_latency", 0.0)
+            if record["last_region"]:
+                frame["extracted_text"] = "\n".join(f"{name}: {text}" for name, text in frame["roi_texts"].items())
+                yield frame
+    return stage
+
+
+# Stage that passes a frame on only when the text in one of its regions changed: each
+# region's block signature (dedup.block_signature, which keeps the band's aspect
+# ratio, so a wide band still has a block per character or so) is compared with its
+# signature when it last changed (the anchor), so a static headline over moving video
+# does not trigger OCR. threshold is in grey levels, default BLOCK_THRESHOLD. frame["roi_keys"] holds the
+# OCR cache key of each region's anchor crop; stats['last_timestamp'] tracks the last frame seen, for text_ranges.
+def roi_change_stage(layout, threshold=None):
+    threshold = BLOCK_THRESHOLD if threshold is None else threshold
+
+    def stage(frames, stats):
+        anchors = {}
+        for frame in frames:
+            stats['last_timestamp'] = frame["timestamp"]
+            changed = False
+            for region in layout:
+                crop = crop_region(frame["image"], region["box"])
+                if not crop.size:
+                    continue
+                value = block_signature(crop)
+                anchor = anchors.get(region["name"])
+                if anchor is None or anchor[0].shape != value.shape or block_distance(value, anchor[0]) > threshold:
+                    anchors[region["name"]] = (value, content_key(crop))
+                    changed = True
+
+            if changed:
+                frame["roi_keys"] = {name: key for name, (_, key) in anchors.items()}
+                yield frame
+            else:
+                stats['text_unchanged'] = stats.get('text_unchanged', 0) + 1
+    return stage
+
+
+# Function to format seconds as HH:MM:SS
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+# Function to turn per-frame region results (from roi_change_stage + OCR) into time
+# ranges per region: [{"region", "text", "start", "end"}]. A text is shown from the
+# frame where it appeared until the next change; the last one until end_timestamp.
+def text_ranges(results, end_timestamp):
+    ranges = []
+    open_ranges = {}
+    for result in results:
+        for region, text in (result.get("roi_texts") or {}).items():
+            current = open_ranges.get(region)
+            if current is not None and current["text"] == text:
+                continue
+            if current is not None:
+                current["end"] = result["timestamp"]
+            open_ranges[region] = {"region": region, "text": text, "start": result["timestamp"], "end": end_timestamp}
+            ranges.append(open_ranges[region])
+
+    ranges.sort(key=lambda item: (item["start"], item["region"]))
+    for item in ranges:
+        item["start_time"] = format_timestamp(item["start"])
+        item["end_time"] = format_timestamp(item["end"])
+    return [item for item in ranges if item["text"].strip()]
@@ -0,0 +1,135 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# OpenAI API Key
+api_key = os.getenv('OPENAI_API_KEY')
+
+# Constants for directories
+DOWNLOAD_DIRECTORY = 'downloads/'
+OUTPUT_FOLDER = 'frames_output/'
+
+# OCR endpoint and defaults shared by every entry point
+OPENAI_CHAT_URL = os.getenv('OPENAI_CHAT_URL', "https://api.openai.com/v1/chat/completions")
+DEFAULT_MODEL = "gpt-4o"
+DEFAULT_PROMPT = "Extract the text from the image?"
+MAX_TOKENS = 300
+
+# Concurrent OCR dispatch: requests in flight, and optional API rate limits (0 = unlimited)
+OCR_CONCURRENCY = int(os.getenv('OCR_CONCURRENCY', '8'))
+OCR_REQUESTS_PER_MINUTE = int(os.getenv('OCR_REQUESTS_PER_MINUTE', '0'))
+OCR_TOKENS_PER_MINUTE = int(os.getenv('OCR_TOKENS_PER_MINUTE', '0'))
+# Pooled OCR HTTP client: keep-alive connections kept open, and request timeout in seconds
+OCR_POOL_SIZE = int(os.getenv('OCR_POOL_SIZE', str(max(OCR_CONCURRENCY, 10))))
+OCR_TIMEOUT = 120
+# Rough token cost of OCR for one image (image + completion), used by the token limit
+OCR_TOKENS_PER_IMAGE = 1100
+# Retries of a failed OCR request (connection error, 429 or 5xx) with jittered
+# exponential backoff between OCR_BACKOFF_BASE and OCR_BACKOFF_MAX seconds
+OCR_MAX_RETRIES = int(os.getenv('OCR_MAX_RETRIES', '5'))
+OCR_BACKOFF_BASE = 0.5
+OCR_BACKOFF_MAX = 30.0
+# Circuit breaker per endpoint: consecutive failed requests (after their retries) that
+# open it, seconds between trial requests while it is open, and failed trials in a row
+# before the run gives up on the endpoint
+OCR_BREAKER_FAILURES = int(os.getenv('OCR_BREAKER_FAILURES', '5'))
+OCR_BREAKER_RESET = float(os.getenv('OCR_BREAKER_RESET', '30'))
+OCR_BREAKER_TRIALS = int(os.getenv('OCR_BREAKER_TRIALS', '4'))
+
+# Multi-image OCR batching: images per request, and base64 payload budget per request
+OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', '1'))
+OCR_BATCH_MAX_BYTES = int(os.getenv('OCR_BATCH_MAX_BYTES', str(4 * 1024 * 1024)))
+# The region crops of one frame go out together as one request, each image with its
+# own prompt, whatever OCR_BATCH_SIZE is (0 = one request per region)
+OCR_BATCH_REGIONS = os.getenv('OCR_BATCH_REGIONS', '1') != '0'
+
+# OCR backend: "openai" (remote), "tesseract" (local) or "hybrid" (local, hard frames
+# escalated to remote); ticker segments use their own backend
+OCR_BACKEND = os.getenv('OCR_BACKEND', 'openai')
+TICKER_OCR_BACKEND = os.getenv('TICKER_OCR_BACKEND', 'hybrid')
+TESSERACT_LANG = os.getenv('TESSERACT_LANG', 'eng+tel')
+# Mean Tesseract word confidence (0-100) below which the hybrid backend escalates a frame
+LOCAL_OCR_MIN_CONFIDENCE = 70
+
+# Persistent OCR result cache (SQLite) and its LRU size limit in entries
+OCR_CACHE_PATH = os.getenv('OCR_CACHE_PATH', 'cache/ocr_cache.sqlite3')
+OCR_CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', '100000'))
+
+# Decode processes per video in extract_frames (1 = sequential), and the size of the
+# shared memory buffer iter_frames_parallel passes decoded frames through (it lives in
+# /dev/shm, so keep it under that mount's size)
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', str(min(4, os.cpu_count() or 1))))
+DECODE_BUFFER_BYTES = int(os.getenv('DECODE_BUFFER_BYTES', str(1024 * 1024 * 1024)))
+
+# In-memory frame encoding for OCR (cv2.imencode); MAX_SIDE=None keeps the source resolution
+JPEG_QUALITY = 95
+MAX_SIDE = None
+
+# Adaptive OCR image preparation (prepare.py): byte budget per image (0 = fixed
+# JPEG_QUALITY / MAX_SIDE as above) and per region crop, payload format ('jpeg' or
+# 'webp'), grayscale ('auto', '1' or '0'), the lowest quality it may use, the short
+# side the remote API reads at most, and how far it may downscale (fraction of the
+# source, minimum short side in pixels)
+OCR_IMAGE_MAX_BYTES = int(os.getenv('OCR_IMAGE_MAX_BYTES', str(150 * 1024)))
+OCR_ROI_MAX_BYTES = int(os.getenv('OCR_ROI_MAX_BYTES', str(64 * 1024)))
+OCR_IMAGE_FORMAT = os.getenv('OCR_IMAGE_FORMAT', 'jpeg')
+OCR_IMAGE_GRAYSCALE = {'1': True, '0': False}.get(os.getenv('OCR_IMAGE_GRAYSCALE', 'auto'), 'auto')
+OCR_IMAGE_MIN_QUALITY = 50
+OCR_IMAGE_MAX_SHORT_SIDE = 768
+OCR_IMAGE_MIN_SCALE = 0.5
+OCR_IMAGE_MIN_SHORT_SIDE = 32
+
+# Region-of-interest layouts per channel (JSON file, optional) and max side of a region crop
+ROI_LAYOUTS_PATH = os.getenv('ROI_LAYOUTS_PATH', 'roi_layouts.json')
+ROI_MAX_SIDE = 1024
+
+# Text-presence prefilter: on by default, and the minimum fraction of the frame covered by text-like regions
+TEXT_PREFILTER = os.getenv('TEXT_PREFILTER', '1') == '1'
+TEXT_PREFILTER_THRESHOLD = float(os.getenv('TEXT_PREFILTER_THRESHOLD', '0.002'))
+
+# Ticker stitching: pixels of the previous segment repeated at the start of the next one
+TICKER_OVERLAP = 64
+
+# URL prefixes accepted by the /process_video style endpoints
+YOUTUBE_PREFIX = 'https://www.youtube.com/'
+BLOB_PREFIX = 'https://quadz.blob.core.windows.net/'
+
+# Parallel ranged downloads: connections, bytes per Range request, read buffer, timeout in seconds
+DOWNLOAD_CONNECTIONS = int(os.getenv('DOWNLOAD_CONNECTIONS', '8'))
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+# Retries of a chunk that got a connection error, a short read, 429 or 5xx (backoff as for OCR)
+DOWNLOAD_RETRIES = int(os.getenv('DOWNLOAD_RETRIES', '4'))
+# A streamed video is teed into the download cache; a decoder read further than this
+# past the downloaded part is fetched from the source instead of waiting for it
+TEE_READAHEAD = 1024 * 1024
+
+# Decode videos straight from their URL while bytes arrive, instead of downloading first
+STREAM_SOURCES = os.getenv('STREAM_SOURCES', '1') == '1'
+
+# Downloaded-video cache: on by default, its SQLite index and the disk cap (LRU) in bytes
+VIDEO_CACHE = os.getenv('VIDEO_CACHE', '1') == '1'
+VIDEO_CACHE_PATH = os.getenv('VIDEO_CACHE_PATH', 'cache/video_cache.sqlite3')
+VIDEO_CACHE_MAX_BYTES = int(os.getenv('VIDEO_CACHE_MAX_BYTES', str(20 * 1024 ** 3)))
+
+# Background jobs for the Flask endpoints: worker threads and finished jobs kept for GET /jobs/<id>
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_HISTORY = int(os.getenv('JOB_HISTORY', '1000'))
+# Seconds between progress events on a job's event stream when no result arrives
+JOB_EVENT_INTERVAL = 2.0
+# Events kept per job for replay (the oldest results are dropped beyond it), and
+# seconds a finished job keeps its result events before only status events are left
+JOB_EVENT_LOG = int(os.getenv('JOB_EVENT_LOG', '1000'))
+JOB_EVENT_TTL = int(os.getenv('JOB_EVENT_TTL', '300'))
+
+# Per-job workspaces: root directory, size quota per workspace in bytes, and seconds a
+# finished job's workspace is kept before it is deleted
+WORKSPACE_ROOT = os.getenv('WORKSPACE_ROOT', 'workspaces/')
+WORKSPACE_MAX_BYTES = int(os.getenv('WORKSPACE_MAX_BYTES', str(5 * 1024 ** 3)))
+WORKSPACE_TTL = int(os.getenv('WORKSPACE_TTL', str(24 * 3600)))
+
+# Columnar result sink: rows buffered before a Parquet row group is written
+RESULTS_FLUSH_ROWS = int(os.getenv('RESULTS_FLUSH_ROWS', '500'))
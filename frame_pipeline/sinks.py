@@ -0,0 +1,189 @@
+import os
+import csv
+import json
+import cv2
+
+from . import settings
+from .roi import ROI_CSV_COLUMNS
+
+# Rows written to a CSV file between two charges against the workspace quota
+CHARGE_ROWS = 1000
+
+
+# Stage that saves each frame as a JPEG file in the output folder.
+# Frames already encoded by encode_stage are written as-is, without re-encoding,
+# unless that payload was prepared for OCR (downscaled, grayscale or WebP).
+# With a workspace, every saved file counts against the workspace quota.
+def save_frames(output_folder, workspace=None):
+    def stage(frames, stats):
+        os.makedirs(output_folder, exist_ok=True)
+        for frame in frames:
+            output_name = os.path.join(output_folder, f"frame_{frame['index']}.jpg")
+            if "jpeg" in frame and not frame.get("prepared"):
+                with open(output_name, 'wb') as f:
+                    f.write(frame["jpeg"])
+            else:
+                cv2.imwrite(output_name, frame["image"])
+            if workspace is not None:
+                workspace.charge(os.path.getsize(output_name))
+            frame["image_name"] = output_name
+            yield frame
+    return stage
+
+
+# Function to write pipeline results to a CSV file. With a workspace, the file counts
+# against the workspace quota as it grows (checked every CHARGE_ROWS rows).
+def write_results_csv(results, csv_file, header, columns, workspace=None):
+    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        charged = 0
+        for number, result in enumerate(results, 1):
+            writer.writerow([result.get(column, "") for column in columns])
+            if workspace is not None and number % CHARGE_ROWS == 0:
+                workspace.charge(file.tell() - charged)
+                charged = file.tell()
+        if workspace is not None:
+            workspace.charge(file.tell() - charged)
+
+    print(f"Results saved to {csv_file}")
+    return csv_file
+
+
+# Function to write region-of-interest results to a CSV file, one column per region
+def write_roi_results_csv(results, csv_file, columns=ROI_CSV_COLUMNS, workspace=None):
+    header = ["Image_Name"] + [column for _, column in columns]
+    return write_results_csv(roi_rows(results, columns), csv_file, header,
+                             ["image_name"] + [column for _, column in columns], workspace)
+
+
+# Function to flatten region-of-interest results into rows with one key per region
+def roi_rows(results, columns=ROI_CSV_COLUMNS):
+    for result in results:
+        row = {"image_name": result.get("image_name", "")}
+        row.update({column: (result.get("roi_texts") or {}).get(region, "") for region, column in columns})
+        yield row
+
+
+# Function to write the dead letters of a run (frames whose OCR failed) to a JSON file,
+# counted against the quota of workspace if one is given
+def write_dead_letters(dead_letters, json_file, workspace=None):
+    with open(json_file, 'w', encoding='utf-8') as file:
+        json.dump(list(dead_letters), file, indent=2)
+    if workspace is not None:
+        workspace.charge(os.path.getsize(json_file))
+
+    print(f"Dead letters saved to {json_file}")
+    return json_file
+
+
+# Function to read dead letters written by write_dead_letters, for reprocess_dead_letters
+def read_dead_letters(json_file):
+    with open(json_file, encoding='utf-8') as file:
+        return json.load(file)
+
+
+# Function to write pipeline results to an XLSX file, streaming rows (openpyxl write-only mode),
+# counted against the quota of workspace if one is given
+def write_results_xlsx(results, xlsx_file, header, columns, workspace=None):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("results")
+    sheet.append(header)
+    for result in results:
+        sheet.append(["" if result.get(column) is None else result.get(column) for column in columns])
+    workbook.save(xlsx_file)
+    if workspace is not None:
+        workspace.charge(os.path.getsize(xlsx_file))
+
+    print(f"Results saved to {xlsx_file}")
+    return xlsx_file
+
+
+# Function to get the Arrow schema of the columnar results
+def results_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("index", pa.int64()),
+        ("timestamp", pa.float64()),
+        ("end_timestamp", pa.float64()),
+        ("image_name", pa.string()),
+        ("region", pa.string()),
+        ("extracted_text", pa.string()),
+        ("roi_texts", pa.map_(pa.string(), pa.string())),
+        ("ocr_latency", pa.float64())
+    ])
+
+
+# Result sink that appends results to a Parquet dataset: every flush_rows results are
+# written as one complete part file (path/part-00000.parquet, ...), so memory stays flat
+# however long the video is, a crash keeps every flushed part, and the directory can be
+# read back with pandas.read_parquet / pyarrow.dataset or read_results. Use it as the
+# on_result callback of run_pipeline / extract_frames; on_result is called after it,
+# and on_flush(last_row) once each part file is on disk (e.g. to commit a checkpoint).
+# With a workspace, every part file counts against the workspace quota.
+class ParquetResultSink:
+    def __init__(self, path, flush_rows=settings.RESULTS_FLUSH_ROWS, on_result=None, on_flush=None, workspace=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.workspace = workspace
+        self.flush_rows = flush_rows
+        self.on_result = on_result
+        self.on_flush = on_flush
+        self.schema = results_schema()
+        self.rows = []
+        self.written = 0
+        # Continue after parts already on disk (a resumed run appends to them)
+        self.parts = len([name for name in os.listdir(path) if name.startswith("part-") and name.endswith(".parquet")])
+
+    def __call__(self, result, stats):
+        row = {name: result.get(name) for name in self.schema.names}
+        if row["roi_texts"] is not None:
+            row["roi_texts"] = list(row["roi_texts"].items())
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_rows:
+            self.flush()
+        if self.on_result:
+            self.on_result(result, stats)
+
+    # Write the buffered rows as the next part file
+    def flush(self):
+        if not self.rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(self.rows, schema=self.schema)
+        # Written under a dot-name first: readers skip it until it is complete
+        temp_path = os.path.join(self.path, f".part-{self.parts:05d}.parquet.tmp")
+        pq.write_table(table, temp_path)
+        part_path = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+        os.replace(temp_path, part_path)
+        self.parts += 1
+        self.written += len(self.rows)
+        last_row, self.rows = self.rows[-1], []
+        if self.on_flush:
+            self.on_flush(last_row)
+        # Charged once the part is committed, so a run stopped by the quota resumes after it
+        if self.workspace is not None:
+            self.workspace.charge(os.path.getsize(part_path))
+
+    def close(self):
+        self.flush()
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Function to read results back from a Parquet dataset, one record batch at a time
+def read_results(path, columns=None):
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(path, format="parquet")
+    for batch in dataset.to_batches(columns=columns):
+        for row in batch.to_pylist():
+            if row.get("roi_texts") is not None:
+                row["roi_texts"] = dict(row["roi_texts"])
+            yield row
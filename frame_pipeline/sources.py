@@ -0,0 +1,178 @@
+import os
+import contextlib
+import urllib.parse
+import cv2
+
+from .download import TeeDownload, ranged_download
+from .settings import DOWNLOAD_DIRECTORY, YOUTUBE_PREFIX, BLOB_PREFIX, STREAM_SOURCES, VIDEO_CACHE
+from .video_cache import canonical_key, default_video_cache
+
+
+# Function to download a video using yt_dlp
+def download_video_ytdlp(youtube_url, download_directory=DOWNLOAD_DIRECTORY):
+    import yt_dlp as youtube_dl
+    ydl_opts = {
+        'format': 'best',
+        'outtmpl': os.path.join(download_directory, '%(title)s.%(ext)s')
+    }
+    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(youtube_url, download=True)
+        return ydl.prepare_filename(info_dict)
+
+
+# Function to download a video directly, with parallel Range requests
+def download_video_blob(blob_url, download_directory=DOWNLOAD_DIRECTORY):
+    os.makedirs(download_directory, exist_ok=True)
+    file_name = urllib.parse.unquote(blob_url.split('/')[-1])
+    download_path = os.path.join(download_directory, file_name)
+    return ranged_download(blob_url, download_path)
+
+
+# Function to reject URLs that are neither YouTube nor blob storage, before any work is queued
+def check_video_url(video_url):
+    if not video_url.startswith((YOUTUBE_PREFIX, BLOB_PREFIX)):
+        raise ValueError("Unsupported URL format.")
+    return video_url
+
+
+# Function to pick the downloader for a video URL
+def download_video(video_url, download_directory=DOWNLOAD_DIRECTORY):
+    if video_url.startswith(YOUTUBE_PREFIX):
+        return download_video_ytdlp(video_url, download_directory)
+    if video_url.startswith(BLOB_PREFIX):
+        return download_video_blob(video_url, download_directory)
+    raise ValueError("Unsupported URL format.")
+
+
+# Function to get a local copy of a video through the download cache, so the same
+# URL (same YouTube id, or same blob ETag) is only downloaded once
+def cached_download(video_url, cache=None):
+    cache = cache or default_video_cache()
+    return cache.fetch(video_url, download_video)
+
+
+# Function to resolve the direct media URL of a YouTube video and its file extension
+# without downloading it
+def youtube_stream(youtube_url):
+    import yt_dlp as youtube_dl
+    ydl_opts = {
+        'format': 'best[protocol^=http]/best',
+        'quiet': True
+    }
+    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(youtube_url, download=False)
+        return info_dict['url'], info_dict.get('ext') or 'mp4'
+
+
+# Function to resolve the direct media URL of a YouTube video without downloading it
+def youtube_stream_url(youtube_url):
+    return youtube_stream(youtube_url)[0]
+
+
+# Function to get the URL to stream a video from and the file name it is cached under
+def stream_source(video_url):
+    if video_url.startswith(YOUTUBE_PREFIX):
+        source, extension = youtube_stream(video_url)
+        return source, f"video.{extension}"
+    if video_url.startswith(BLOB_PREFIX):
+        return video_url, urllib.parse.unquote(video_url.split('?')[0].split('/')[-1])
+    raise ValueError("Unsupported URL format.")
+
+
+# Function to check that OpenCV can open a video path or URL
+def can_decode(source):
+    cap = cv2.VideoCapture(source)
+    opened = cap.isOpened()
+    cap.release()
+    return opened
+
+
+# Function to get a video source for decoding. With stream=True it returns a URL that
+# OpenCV's FFmpeg backend decodes while the bytes arrive (range requests reach the
+# index), so the first frames are decoded and OCR'd before the download would have
+# finished. It falls back to downloading the whole file if the stream can't be opened.
+# With VIDEO_CACHE on, a video already in the download cache is read from disk and one
+# that is not is downloaded into it. The file is not pinned and nothing is cached
+# while streaming: jobs use video_source, which does both.
+def open_video_source(video_url, stream=STREAM_SOURCES, download_directory=DOWNLOAD_DIRECTORY, cache=VIDEO_CACHE):
+    key = None
+    if cache:
+        key = canonical_key(video_url)
+        path = default_video_cache().get(key)
+        if path:
+            return path
+
+    if stream:
+        source = stream_source(video_url)[0]
+        if can_decode(source):
+            return source
+        print(f"Could not stream {video_url}, downloading it first")
+    if cache:
+        return default_video_cache().fetch(video_url, download_video, key)
+    return download_video(video_url, download_directory)
+
+
+# Function to describe where a job's video was read from, for its result: the local
+# file (cached or downloaded), or the source URL when it was streamed (the source
+# video_source yields is then a local tee URL that is gone once the job ends)
+def video_location(video_url, source):
+    return source if os.path.isfile(source) else video_url
+
+
+# Function (a context manager) to decode a video through the download cache: yields a
+# source as open_video_source does, keeping the cached file pinned (never evicted)
+# until the block ends. A video not in the cache is streamed through a TeeDownload,
+# so the bytes the decoder reads are also written to the cache entry, which is
+# recorded once the download completes (it goes on in the background if the block
+# ends first). Only one request per URL tees it; others stream it directly meanwhile.
+@contextlib.contextmanager
+def video_source(video_url, stream=STREAM_SOURCES, download_directory=DOWNLOAD_DIRECTORY, cache=VIDEO_CACHE):
+    if not cache:
+        yield open_video_source(video_url, stream, download_directory, cache=False)
+        return
+    video_cache = default_video_cache()
+    key = canonical_key(video_url)
+    path = video_cache.get(key, pin=True)
+
+    if path is None and stream:
+        source, file_name = stream_source(video_url)
+        lock = video_cache.key_lock(key)
+        if not lock.acquire(blocking=False):
+            if can_decode(source):
+                yield source
+                return
+        else:
+            # The lock is released by the download, once it is done
+            def finished(done_path):
+                try:
+                    if done_path:
+                        video_cache.put(key, done_path)
+                finally:
+                    lock.release()
+
+            tee = TeeDownload(source, os.path.join(video_cache.entry_directory(key), file_name), on_done=finished)
+            try:
+                started = tee.start()
+            except Exception:
+                lock.release()
+                raise
+            if not started:
+                lock.release()
+            else:
+                with video_cache.pinned(tee.path):
+                    decodable = can_decode(tee.url)
+                    if decodable:
+                        try:
+                            yield tee.url
+                        finally:
+                            tee.close()
+                        return
+                tee.close(cancel=True)
+        print(f"Could not stream {video_url}, downloading it first")
+
+    if path is None:
+        path = video_cache.fetch(video_url, download_video, key, pin=True)
+    try:
+        yield path
+    finally:
+        video_cache.release(path)
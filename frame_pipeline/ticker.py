@@ -0,0 +1,104 @@
+import numpy as np
+import cv2
+
+from . import settings
+from .ocr import encode_frame
+from .prepare import ImagePreparer
+from .roi import crop_region, get_layout
+
+# Phase-correlation peak below which two bands are treated as unrelated (cut, ticker change)
+MIN_RESPONSE = 0.1
+
+# Prompt for one stitched segment of the ticker panorama
+TICKER_PROMPT = ("The image is a strip of a scrolling news ticker. Extract the text in it, left to right. "
+                 "Reply with the text only.")
+
+
+# Function to find the ticker band box in a channel layout
+def ticker_box(channel=None):
+    for region in get_layout(channel):
+        if region["name"] == "ticker":
+            return region["box"]
+    raise ValueError(f"Layout for channel {channel or 'default'} has no ticker region")
+
+
+# Function to estimate how many pixels the band content moved left between two
+# grayscale float32 bands; returns (offset, response), response being the peak strength
+def scroll_offset(previous_band, band, window):
+    (dx, _), response = cv2.phaseCorrelate(previous_band, band, window)
+    return int(round(-dx)), response
+
+
+# Stage that tracks the ticker band across frames and stitches the newly scrolled-in
+# columns into a panorama. It yields one record per segment_width pixels of new ticker
+# content (default: one band width, i.e. one scroll cycle), so OCR runs once per cycle
+# instead of once per frame. Each segment starts with `overlap` pixels of the previous
+# one so a word cut at the boundary is readable in one of them.
+# With max_bytes each strip is prepared within that budget (see prepare.py); strips
+# are short, so their height is never capped by max_short_side.
+def ticker_stage(box, segment_width=None, overlap=settings.TICKER_OVERLAP, quality=settings.JPEG_QUALITY,
+                 max_side=None, max_bytes=settings.OCR_ROI_MAX_BYTES, image_format=settings.OCR_IMAGE_FORMAT,
+                 grayscale=settings.OCR_IMAGE_GRAYSCALE):
+    preparer = None
+    if max_bytes:
+        preparer = ImagePreparer(max_bytes, image_format, grayscale, quality, max_side=max_side, max_short_side=None)
+
+    def segment_record(columns, tail, first, last):
+        strip = np.hstack([tail] + columns) if tail is not None else np.hstack(columns)
+        return {
+            "index": first["index"],
+            "timestamp": first["timestamp"],
+            "end_timestamp": last["timestamp"],
+            "region": "ticker",
+            "image": strip,
+            "jpeg": encode_frame(strip, quality, max_side) if preparer is None else preparer.prepare(strip),
+            "prompt": TICKER_PROMPT,
+        }
+
+    def stage(frames, stats):
+        window = None
+        previous = None
+        columns, width, tail = [], 0, None
+        first = last = None
+
+        for frame in frames:
+            # Copy the band so the full frame can be freed while the segment builds up
+            band = crop_region(frame["image"], box).copy()
+            gray = cv2.cvtColor(band, cv2.COLOR_BGR2GRAY).astype(np.float32)
+            stats['ticker_frames'] = stats.get('ticker_frames', 0) + 1
+            cycle = segment_width or band.shape[1]
+
+            if previous is None or previous.shape != gray.shape:
+                window = cv2.createHanningWindow(gray.shape[::-1], cv2.CV_32F)
+                offset, response = 0, 0.0
+            else:
+                offset, response = scroll_offset(previous, gray, window)
+            previous = gray
+
+            if response < MIN_RESPONSE:
+                # Nothing to line up with: start over from the whole band
+                if columns:
+                    stats['ticker_segments'] = stats.get('ticker_segments', 0) + 1
+                    yield segment_record(columns, tail, first, last)
+                columns, width, tail = [band], band.shape[1], None
+                first = last = frame
+            elif 0 < offset < band.shape[1]:
+                columns.append(band[:, -offset:].copy())
+                width += offset
+                first = first or frame
+                last = frame
+            else:
+                last = frame
+
+            if width >= cycle:
+                stats['ticker_segments'] = stats.get('ticker_segments', 0) + 1
+                segment = segment_record(columns, tail, first, last)
+                yield segment
+                tail = segment["image"][:, -overlap:].copy() if overlap else None
+                columns, width = [], 0
+                first = None
+
+        if columns:
+            stats['ticker_segments'] = stats.get('ticker_segments', 0) + 1
+            yield segment_record(columns, tail, first or last, last)
+    return stage
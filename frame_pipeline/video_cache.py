@@ -0,0 +1,160 @@
+import os
+import time
+import shutil
+import hashlib
+import sqlite3
+import threading
+import contextlib
+import urllib.parse
+
+from . import settings
+from .download import download_session, probe_url
+
+
+# Function to build the cache key of a video URL: the video id for YouTube, and the
+# blob URL (without SAS query) plus its ETag / Last-Modified for blob storage, so a
+# re-uploaded blob is downloaded again
+def canonical_key(video_url, session=None):
+    parsed = urllib.parse.urlparse(video_url)
+    if video_url.startswith(settings.YOUTUBE_PREFIX) or parsed.netloc == 'youtu.be':
+        video_id = urllib.parse.parse_qs(parsed.query).get('v', [''])[0]
+        if not video_id:
+            video_id = parsed.path.rstrip('/').split('/')[-1]
+        return f"youtube:{video_id}"
+    if video_url.startswith(settings.BLOB_PREFIX):
+        size, _, validator = probe_url(session or download_session(1), video_url)
+        return f"blob:{parsed.scheme}://{parsed.netloc}{parsed.path}|{validator or size}"
+    raise ValueError("Unsupported URL format.")
+
+
+# Downloaded videos on disk, indexed in SQLite by canonical key. Each entry lives in
+# its own sub-directory of `directory`; least recently used entries are deleted once
+# the files add up to more than max_bytes, except files pinned by a reader (pinned(),
+# or get/fetch with pin=True and a matching release()), which are never deleted while
+# in use and go once they are released and a later put needs the room.
+class VideoCache:
+    def __init__(self, directory=settings.DOWNLOAD_DIRECTORY, path=settings.VIDEO_CACHE_PATH,
+                 max_bytes=settings.VIDEO_CACHE_MAX_BYTES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.pins = {}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS video_cache ("
+            " key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS video_cache_last_used ON video_cache (last_used)")
+        self.db.commit()
+
+    # Lock held while one key is downloaded, so concurrent requests for it wait instead of downloading twice
+    def key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    # Directory a new entry is downloaded into
+    def entry_directory(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+
+    # Pin a file (caller holds the lock)
+    def pin(self, path):
+        path = os.path.abspath(path)
+        self.pins[path] = self.pins.get(path, 0) + 1
+
+    # Release a pin taken by get, put or fetch with pin=True
+    def release(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            self.pins[path] -= 1
+            if not self.pins[path]:
+                del self.pins[path]
+
+    # Keep the file at path from being evicted while the block runs; the file does not
+    # have to be in the cache yet (a download on its way in)
+    @contextlib.contextmanager
+    def pinned(self, path):
+        with self.lock:
+            self.pin(path)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    # Return the cached file path, or None on a miss (or if the file was removed);
+    # pin=True pins a hit until release(path)
+    def get(self, key, pin=False):
+        with self.lock:
+            row = self.db.execute("SELECT path FROM video_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.exists(row[0]):
+                if row is not None:
+                    self.db.execute("DELETE FROM video_cache WHERE key = ?", (key,))
+                    self.db.commit()
+                self.misses += 1
+                return None
+            self.hits += 1
+            if pin:
+                self.pin(row[0])
+            self.db.execute("UPDATE video_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return row[0]
+
+    # Record a downloaded file and evict least recently used entries over the size cap,
+    # skipping pinned files; pin=True pins the new file until release(path)
+    def put(self, key, path, pin=False):
+        with self.lock:
+            if pin:
+                self.pin(path)
+            self.db.execute(
+                "INSERT OR REPLACE INTO video_cache (key, path, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, path, os.path.getsize(path), time.time())
+            )
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM video_cache").fetchone()[0]
+            if self.max_bytes and total > self.max_bytes:
+                rows = self.db.execute(
+                    "SELECT key, path, size FROM video_cache WHERE key != ? ORDER BY last_used", (key,)
+                ).fetchall()
+                for old_key, old_path, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    if os.path.abspath(old_path) in self.pins:
+                        continue
+                    shutil.rmtree(self.entry_directory(old_key), ignore_errors=True)
+                    if os.path.exists(old_path):
+                        os.remove(old_path)
+                    self.db.execute("DELETE FROM video_cache WHERE key = ?", (old_key,))
+                    total -= size
+            self.db.commit()
+
+    # Return the cached file for a URL, downloading it into the cache on a miss;
+    # pin=True pins it until release(path)
+    def fetch(self, video_url, download, key=None, pin=False):
+        key = key or canonical_key(video_url)
+        with self.key_lock(key):
+            path = self.get(key, pin)
+            if path is None:
+                path = download(video_url, self.entry_directory(key))
+                self.put(key, path, pin)
+            return path
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+_default_video_cache = None
+_default_video_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide video cache
+def default_video_cache():
+    global _default_video_cache
+    with _default_video_cache_lock:
+        if _default_video_cache is None:
+            _default_video_cache = VideoCache()
+        return _default_video_cache
@@ -0,0 +1,74 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import threading
+
+from . import settings
+
+
+class WorkspaceQuotaExceeded(OSError):
+    pass
+
+
+# Function to check a workspace (or job) id: 32 lowercase hex digits, as uuid4().hex gives,
+# so it can never name a path outside the workspace root
+def check_workspace_id(workspace_id):
+    if not isinstance(workspace_id, str) or not re.fullmatch(r'[0-9a-f]{32}', workspace_id):
+        raise ValueError("Invalid workspace id.")
+    return workspace_id
+
+
+# Scratch directory of one job: saved frames go in `frames`, result files next to it,
+# so concurrent jobs never write to the same paths. Bytes written through charge()
+# count against max_bytes.
+class Workspace:
+    def __init__(self, workspace_id=None, root=settings.WORKSPACE_ROOT, max_bytes=settings.WORKSPACE_MAX_BYTES,
+                 create=True):
+        workspace_id = check_workspace_id(workspace_id or uuid.uuid4().hex)
+        self.id = workspace_id
+        self.root = root
+        self.max_bytes = max_bytes
+        self.path = os.path.join(root, workspace_id)
+        self.frames = os.path.join(self.path, 'frames')
+        if not create and not os.path.isdir(self.path):
+            raise ValueError("Unknown or expired workspace.")
+        os.makedirs(self.frames, exist_ok=True)
+        self.lock = threading.Lock()
+        self.used = self.usage()
+
+    # Path of a file in the workspace
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    # Bytes currently on disk in the workspace
+    def usage(self):
+        total = 0
+        for directory, _, files in os.walk(self.path):
+            total += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        return total
+
+    # Count bytes written to the workspace, raising once it is over its quota
+    def charge(self, nbytes):
+        with self.lock:
+            self.used += nbytes
+            if self.max_bytes and self.used > self.max_bytes:
+                raise WorkspaceQuotaExceeded(f"Workspace {self.id} is over its quota of {self.max_bytes} bytes")
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+# Function to delete workspaces under root not modified for ttl seconds, except the ids in keep
+def cleanup_workspaces(root=settings.WORKSPACE_ROOT, ttl=settings.WORKSPACE_TTL, keep=()):
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    cutoff = time.time() - ttl
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name not in keep and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -1,53 +1,7 @@
-import base64
-import requests
-import os
-from dotenv import load_dotenv
-load_dotenv()
-
-# OpenAI API Key
-api_key = os.getenv('OPENAI_API_KEY')
-
-# Function to encode the image
-def encode_image(image_path):
-  with open(image_path, "rb") as image_file:
-    return base64.b64encode(image_file.read()).decode('utf-8')
+from frame_pipeline import extract_text_from_image
 
 # Path to your image
 image_path = r"frames_output\frame_8.jpg"
 
-# Getting the base64 string
-base64_image = encode_image(image_path)
-
-headers = {
-  "Content-Type": "application/json",
-  "Authorization": f"Bearer {api_key}"
-}
-
-payload = {
-  "model": "gpt-4o",
-  "messages": [
-    {
-      "role": "user",
-      "content": [
-        {
-          "type": "text",
-          "text": "Extract the text from the image?"
-        },
-        {
-          "type": "image_url",
-          "image_url": {
-            "url": f"data:image/jpeg;base64,{base64_image}"
-          }
-        }
-      ]
-    }
-  ],
-  "max_tokens": 300
-}
-
-response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-
-response = response.json()
-
-telugu_text = response['choices'][0]['message']['content']
-print(telugu_text)
\ No newline at end of file
+telugu_text = extract_text_from_image(image_path)
+print(telugu_text)
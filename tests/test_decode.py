@@ -0,0 +1,51 @@
+import json
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+from frame_pipeline import decode
+
+
+# ffprobe output for an MPEG-TS recording: pts_time counts from the stream's start_time
+FFPROBE_OUTPUT = {
+    "frames": [{"pts_time": "1.400000"}, {"pts_time": "3.400000"}, {"pts_time": "5.400000"}],
+    "streams": [{"start_time": "1.400000"}]
+}
+
+
+def test_keyframe_timestamps_count_from_the_stream_start(monkeypatch):
+    def run(command, **kwargs):
+        return subprocess.CompletedProcess(command, 0, stdout=json.dumps(FFPROBE_OUTPUT))
+
+    monkeypatch.setattr(decode.subprocess, "run", run)
+    timestamps = decode.keyframe_timestamps("recording.ts")
+
+    assert [round(t, 6) for t in timestamps] == [0.0, 2.0, 4.0]
+
+
+# Function to write a short MJPEG video whose frames all differ; returns its path
+def write_video(path, frames=60):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    rng = np.random.default_rng(0)
+    for index in range(frames):
+        image = rng.integers(0, 255, (48, 64, 3), np.uint8)
+        cv2.putText(image, str(index), (4, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        writer.write(image)
+    writer.release()
+    return path
+
+
+@pytest.mark.parametrize("sample", [{}, {"every_nth": 3}, {"timestamps": [0.2, 0.9, 2.0]}, {"start_frame": 17}])
+def test_parallel_output_equals_sequential(tmp_path, sample):
+    video = write_video(str(tmp_path / "video.avi"))
+    sequential_stats, parallel_stats = {}, {}
+    sequential = list(decode.iter_frames(video, sequential_stats, **sample))
+    # A buffer of 4 frames: workers wait for the consumer instead of holding their whole range
+    parallel = list(decode.iter_frames_parallel(video, parallel_stats, workers=2, segment_frames=10,
+                                                buffer_bytes=4 * 64 * 48 * 3, **sample))
+
+    assert [(f["index"], f["timestamp"]) for f in parallel] == [(f["index"], f["timestamp"]) for f in sequential]
+    assert all(np.array_equal(p["image"], s["image"]) for p, s in zip(parallel, sequential))
+    assert parallel_stats['decoded'] == sequential_stats['decoded']
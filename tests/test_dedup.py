@@ -0,0 +1,31 @@
+import cv2
+import numpy as np
+
+from frame_pipeline.dedup import BLOCK_THRESHOLD, block_distance, block_signature
+
+
+# Function to draw a headline over a noisy gradient, JPEG-encoded at `quality` like a saved frame
+def headline_frame(text, quality=90):
+    rng = np.random.default_rng(0)
+    image = np.tile(np.linspace(40, 160, 1280, dtype=np.float32), (720, 1))
+    image = np.clip(image + rng.normal(0, 6, image.shape), 0, 255).astype(np.uint8)
+    image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    cv2.rectangle(image, (0, 560), (1280, 640), (20, 20, 120), -1)
+    cv2.putText(image, text, (40, 615), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (255, 255, 255), 3)
+    _, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+
+
+def test_signature_is_per_block():
+    signature = block_signature(headline_frame("MARKETS RALLY"))
+
+    assert signature.shape == (22, 40, 4)
+    assert signature.nbytes < 160 * 90 / 4
+
+
+# A re-encode of the same frame is a repeat; one changed character of the headline is not
+def test_one_character_change_is_kept():
+    frame = block_signature(headline_frame("MARKETS RALLY AFTER VOTE"))
+
+    assert block_distance(frame, block_signature(headline_frame("MARKETS RALLY AFTER VOTE", 75))) <= BLOCK_THRESHOLD
+    assert block_distance(frame, block_signature(headline_frame("MARKETS RALLY AFTER VOTF"))) > BLOCK_THRESHOLD
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from frame_pipeline.download import ranged_download
+from frame_pipeline.mock_server import start_mock_blob_server
+
+CHUNK_SIZE = 64 * 1024
+PAYLOAD = os.urandom(CHUNK_SIZE * 8 + 1000)
+
+
+@pytest.fixture
+def blob():
+    server, url = start_mock_blob_server(PAYLOAD)
+    server.url = url
+    yield server
+    server.shutdown()
+
+
+# Function to download the mock blob in CHUNK_SIZE ranges over 4 connections
+def download(blob, path, retries=0):
+    return ranged_download(blob.url, path, connections=4, chunk_size=CHUNK_SIZE, retries=retries)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_full_download(blob, tmp_path):
+    path = str(tmp_path / "video.mp4")
+    download(blob, path)
+
+    assert read(path) == PAYLOAD
+    assert blob.requests == 9
+    assert not os.path.exists(path + '.part.json')
+
+
+# 503s on a couple of chunks are retried instead of failing the download
+def test_transient_errors_are_retried(blob, tmp_path):
+    path = str(tmp_path / "video.mp4")
+    blob.unavailable = 2
+    download(blob, path, retries=2)
+
+    assert read(path) == PAYLOAD
+    assert blob.requests == 11
+
+
+# A chunk that fails for good fails the download; the next run fetches only that chunk
+def test_resume_after_failed_chunk(blob, tmp_path):
+    path = str(tmp_path / "video.mp4")
+    blob.unavailable = 1
+    with pytest.raises(IOError, match="503"):
+        download(blob, path)
+    assert os.path.exists(path + '.part.json')
+
+    blob.requests = 0
+    download(blob, path)
+    assert read(path) == PAYLOAD
+    assert blob.requests == 1
+
+
+# Chunks saved under the old ETag are thrown away once the blob has changed
+def test_validator_change_restarts(blob, tmp_path):
+    path = str(tmp_path / "video.mp4")
+    blob.unavailable = 1
+    with pytest.raises(IOError):
+        download(blob, path)
+
+    changed = bytes(255 - byte for byte in PAYLOAD)
+    blob.payload, blob.etag = changed, '"changed"'
+    blob.requests = 0
+    download(blob, path)
+    assert read(path) == changed
+    assert blob.requests == 9
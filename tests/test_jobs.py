@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+flask = pytest.importorskip("flask")
+
+from frame_pipeline.api import jobs_blueprint
+from frame_pipeline.jobs import JobQueue
+
+
+@pytest.fixture
+def client(tmp_path):
+    jobs = JobQueue(workers=1, workspace_root=str(tmp_path))
+    app = flask.Flask(__name__)
+    app.register_blueprint(jobs_blueprint(jobs))
+    client = app.test_client()
+    client.jobs = jobs
+    return client
+
+
+# Function to submit a job and wait for it to finish; returns its id
+def run_job(jobs, func):
+    job_id = jobs.submit(func)
+    for _ in range(100):
+        if jobs.get(job_id)["finished"] is not None:
+            break
+        time.sleep(0.01)
+    return job_id
+
+
+def summary_job(progress, on_result, workspace):
+    on_result({"index": 0, "extracted_text": "text"}, progress)
+    return {"results_file": workspace.file("results.csv"), "num_frames": 1}
+
+
+def test_job_status(client):
+    job_id = run_job(client.jobs, summary_job)
+    response = client.get(f"/jobs/{job_id}")
+
+    assert response.status_code == 200
+    assert response.json["status"] == "done"
+    assert response.json["result"]["num_frames"] == 1
+    assert client.get("/jobs/" + "0" * 32).status_code == 404
+
+
+def test_job_events_resume_from_last_event_id(client):
+    job_id = run_job(client.jobs, summary_job)
+    response = client.get(f"/jobs/{job_id}/events?format=ndjson", headers={"Last-Event-ID": "1"})
+
+    events = [line for line in response.data.decode().splitlines() if line]
+    assert response.status_code == 200
+    assert len(events) == 2
+    assert '"event": "result"' in events[0] and '"event": "done"' in events[1]
+
+
+def test_malformed_last_event_id_is_a_bad_request(client):
+    job_id = run_job(client.jobs, summary_job)
+
+    assert client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": "abc"}).status_code == 400
@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_pipeline.bench import bench_resume
+
+
+# Function to write a short video whose every frame shows its own number, so no two
+# frames are alike and dedup keeps them all
+@pytest.fixture
+def video_path(tmp_path):
+    path = str(tmp_path / "counter.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 25, (320, 180))
+    for index in range(120):
+        image = np.full((180, 320, 3), 255, np.uint8)
+        cv2.putText(image, f"Frame {index:03d}", (20, 110), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+        writer.write(image)
+    writer.release()
+    return path
+
+
+# The mock endpoint goes down after 8 requests: the first run has to fail partway, and
+# the resume has to finish the video with every sampled frame written exactly once and
+# no OCR error left in the dataset. Without client retries the frames failed before the
+# breaker opened are dead letters, which the resume has to reprocess.
+@pytest.mark.parametrize("max_retries", [0, 1])
+def test_resume_after_endpoint_failure(video_path, max_retries):
+    report = bench_resume(video_path, fail_after=8, sample={"every_nth": 2}, max_retries=max_retries)
+
+    assert report["first_run_failed"]
+    assert 0 < report["resumed_from_frame"] < 120
+    assert report["results"] == 60
+    assert report["duplicate_results"] == 0
+    assert report["missing_results"] == 0
+    assert report["error_results"] == 0
+    assert report["dead_letters"] == 0
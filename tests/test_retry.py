@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from frame_pipeline.client import OCRClient
+from frame_pipeline.mock_server import start_mock_server
+from frame_pipeline.ocr import ocr_stage
+from frame_pipeline.retry import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def server():
+    server, url = start_mock_server()
+    server.url = url
+    yield server
+    server.shutdown()
+
+
+# Function to OCR `count` blank frames through ocr_stage with the given client
+def run_ocr(client, count=8, concurrency=8):
+    frames = [{"index": index, "jpeg": b"\xff\xd8\xff"} for index in range(count)]
+    stage = ocr_stage(backend=client, concurrency=concurrency, requests_per_minute=0, tokens_per_minute=0)
+    return list(stage(iter(frames), {}))
+
+
+# Eight frames in flight each get one 503: every request recovers on its retry, so the
+# breaker never sees a failed request and the run goes on
+def test_transient_errors_do_not_open_the_breaker(server):
+    server.unavailable = 8
+    breaker = CircuitBreaker(failures=5, reset=0.1)
+    client = OCRClient(api_key="mock", url=server.url, max_retries=5, breaker=breaker)
+    try:
+        frames = run_ocr(client)
+    finally:
+        client.close()
+
+    assert [frame["extracted_text"] for frame in frames] == ["mock text"] * 8
+    assert not breaker.is_open
+
+
+# With the circuit open, calls wait for the trial request instead of failing; once the
+# endpoint is back the trial closes the circuit and the waiting frames are OCR'd
+def test_open_circuit_waits_for_the_trial(server):
+    breaker = CircuitBreaker(failures=1, reset=0.2)
+    breaker.record_failure()
+    client = OCRClient(api_key="mock", url=server.url, max_retries=0, breaker=breaker)
+    start = time.monotonic()
+    try:
+        frames = run_ocr(client)
+    finally:
+        client.close()
+
+    assert time.monotonic() - start >= 0.2
+    assert [frame["extracted_text"] for frame in frames] == ["mock text"] * 8
+    assert server.requests == 8
+    assert not breaker.is_open
+
+
+# An endpoint that stays down through every trial fails the run
+def test_dead_endpoint_fails_after_the_trials(server):
+    server.fail_after = 0
+    breaker = CircuitBreaker(failures=2, reset=0.05, trials=2)
+    client = OCRClient(api_key="mock", url=server.url, max_retries=0, breaker=breaker)
+    try:
+        with pytest.raises(CircuitOpenError):
+            run_ocr(client, count=20, concurrency=4)
+    finally:
+        client.close()
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from frame_pipeline.client import OCRClient
+from frame_pipeline.mock_server import start_mock_server
+from frame_pipeline.ocr import ocr_stage
+from frame_pipeline.retry import CircuitBreaker
+from frame_pipeline.roi import get_layout, merge_rois, split_rois
+
+
+@pytest.fixture
+def client():
+    server, url = start_mock_server()
+    client = OCRClient(api_key="mock", url=url, max_retries=0, breaker=CircuitBreaker())
+    client.server = server
+    yield client
+    client.close()
+    server.shutdown()
+
+
+# Function to OCR the default layout's regions of `count` noise frames; returns the merged frames
+def run_regions(client, batch_regions, count=6):
+    rng = np.random.default_rng(0)
+    frames = ({"index": index, "timestamp": index / 25, "image": rng.integers(0, 255, (360, 640, 3), np.uint8)}
+              for index in range(count))
+    stages = [split_rois(get_layout("default")),
+              ocr_stage(backend=client, requests_per_minute=0, tokens_per_minute=0, batch_size=1,
+                        batch_regions=batch_regions),
+              merge_rois()]
+    stats = {}
+    for stage in stages:
+        frames = stage(frames, stats)
+    return list(frames), stats
+
+
+# The four regions of a frame (the logo with a prompt of its own) go out as one request
+def test_regions_of_a_frame_share_one_request(client):
+    frames, stats = run_regions(client, batch_regions=True)
+
+    assert client.server.requests == 6
+    assert stats['ocr_calls'] == 24
+    assert all(frame["roi_texts"] == {"ticker": "mock text", "headline": "mock text", "top": "mock text",
+                                      "logo": "mock text"} for frame in frames)
+
+
+def test_one_request_per_region_when_turned_off(client):
+    frames, _ = run_regions(client, batch_regions=False)
+
+    assert client.server.requests == 24
+    assert all(set(frame["roi_texts"].values()) == {"mock text"} for frame in frames)
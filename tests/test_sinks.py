@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from frame_pipeline.sinks import ParquetResultSink, read_results, write_dead_letters, write_results_csv
+from frame_pipeline.workspace import Workspace, WorkspaceQuotaExceeded
+
+RESULTS = [{"index": index, "timestamp": index / 25, "image_name": f"frame_{index}.jpg",
+            "extracted_text": f"text {index}"} for index in range(10)]
+
+
+# Every result file written into a workspace is charged to it, as saved frames are
+def test_result_files_count_against_the_workspace(tmp_path):
+    workspace = Workspace(root=str(tmp_path))
+    with ParquetResultSink(workspace.file("results.parquet"), flush_rows=4, workspace=workspace) as sink:
+        for result in RESULTS:
+            sink(result, {})
+    csv_file = write_results_csv(read_results(sink.path), workspace.file("results.csv"), ["Image_Name", "Text"],
+                                 ["image_name", "extracted_text"], workspace)
+    write_dead_letters([{"index": 3, "timestamp": 0.12}], workspace.file("dead_letters.json"), workspace)
+
+    assert sink.parts == 3
+    assert os.path.getsize(csv_file) > 0
+    assert workspace.used == workspace.usage()
+
+
+def test_csv_past_the_quota_fails(tmp_path):
+    workspace = Workspace(root=str(tmp_path), max_bytes=100)
+    with pytest.raises(WorkspaceQuotaExceeded):
+        write_results_csv(RESULTS, workspace.file("results.csv"), ["Image_Name", "Text"],
+                          ["image_name", "extracted_text"], workspace)
@@ -1,13 +1,15 @@
 from flask import Flask, render_template, request, jsonify, url_for
-from pytube import YouTube
 import cv2
 import os
+import numpy as np
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
 from datetime import datetime
-import math
 from moviepy.editor import VideoFileClip
 
+from frame_pipeline import (VideoCache, Workspace, cached_download, cleanup_workspaces, iter_frames, block_signature,
+                            block_distance, save_hash_index, load_hash_index, keep_mask, BLOCK_THRESHOLD)
+
 load_dotenv()
 
 connect_str = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
@@ -16,15 +18,30 @@ app = Flask(__name__, static_folder='static')
 
 # Define the directory where downloads will be saved
 DOWNLOAD_DIRECTORY = './static/downloads/'
-FRAMES_DIRECTORY = './static/frames/'
-# Define the directory where the videos are stored
-OUTPUT_VIDEO_DIRECTORY = './static/output_videos/'
+# Each /convert gets its own workspace (frames, dedup index, stitched videos) under here,
+# passed from step to step as a form field, so concurrent users don't overwrite each other
+WORKSPACE_ROOT = './static/workspaces/'
+# Downloaded videos are kept (LRU, size-capped) so the same URL is not downloaded twice;
+# the index stays out of ./static, which is served as-is
+VIDEO_CACHE = VideoCache(DOWNLOAD_DIRECTORY, path='./cache/webapp9_video_cache.sqlite3')
 
 # Function to create a directory if it doesn't exist
 def create_directory(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+# Function to open the workspace of an earlier step, or a new one when workspace_id is None
+def open_workspace(workspace_id=None):
+    return Workspace(workspace_id, WORKSPACE_ROOT, create=workspace_id is None)
+
+# Function to turn a file path under ./static into the path used in static URLs
+def static_path(path):
+    return os.path.relpath(path, './static').replace(os.sep, '/')
+
+# Function to list the frames saved in a workspace
+def list_frames(workspace):
+    return sorted([f for f in os.listdir(workspace.frames) if f.endswith('.jpg')])
+
 def upload_video(video_path, video_name, connect_str):
     if not os.path.isfile(video_path):
         raise FileNotFoundError(f"The file {video_path} does not exist.")
@@ -58,11 +75,8 @@ def index():
 def download():
     youtube_url = request.form['url']
     try:
-        yt = YouTube(youtube_url)
-        video = yt.streams.filter(progressive=True, file_extension='mp4').first()
-        video.download(DOWNLOAD_DIRECTORY)
-        video_filename = video.default_filename
-        download_path = os.path.join(DOWNLOAD_DIRECTORY, video_filename)
+        download_path = cached_download(youtube_url, VIDEO_CACHE)
+        video_filename = os.path.relpath(download_path, DOWNLOAD_DIRECTORY)
         message = f'{video_filename} downloaded successfully! <br> Download path: {download_path}'
     except Exception as e:
         message = f'Error downloading video: {str(e)}'
@@ -73,120 +87,127 @@ def download():
 def convert():
     video_filename = request.form['video_filename']
     video_path = os.path.join(DOWNLOAD_DIRECTORY, video_filename)
+    workspace = None
    
     try:
         if not os.path.exists(video_path):
             return render_template('download.html', message=f"Error: Video file not found at {video_path}", last_step='download')
 
-        create_directory(FRAMES_DIRECTORY)
-        cap = cv2.VideoCapture(video_path)
+        cleanup_workspaces(WORKSPACE_ROOT)
+        workspace = open_workspace()
 
-        if not cap.isOpened():
-            return render_template('download.html', message="Error: Could not open video file.", last_step='download')
-       
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_interval = math.ceil(fps / 5)  # Extract 5 frames per second
-
-        frame_count = 0
+        # Extract 5 frames per second; the frames in between are grabbed but never decoded
         frame_number = 0
         frame_files = []
+        frame_names = []
+        frame_signatures = []
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-           
-            if frame_count % frame_interval == 0:
+        # The video stays pinned in the cache while it is read, so a /download of
+        # another video can't evict it halfway
+        with VIDEO_CACHE.pinned(video_path):
+            for frame in iter_frames(video_path, target_fps=5):
                 frame_filename = f'frame_{frame_number:04d}.jpg'
-                frame_filepath = os.path.join(FRAMES_DIRECTORY, frame_filename)
-                cv2.imwrite(frame_filepath, frame)
-                frame_files.append(f'frames/{frame_filename}')
+                frame_filepath = os.path.join(workspace.frames, frame_filename)
+                cv2.imwrite(frame_filepath, frame["image"])
+                workspace.charge(os.path.getsize(frame_filepath))
+                frame_files.append(static_path(frame_filepath))
+                # Sign the frame now, while it is decoded, so dedup never re-reads it
+                frame_names.append(frame_filename)
+                frame_signatures.append(block_signature(frame["image"]))
                 frame_number += 1
-           
-            frame_count += 1
-       
-        cap.release()
-        message = f"Frames extracted successfully. Total frames: {frame_number}"
 
-        os.remove(video_path)
+        if not frame_files:
+            return render_template('download.html', message="Error: Could not open video file.", last_step='download')
+
+        save_hash_index(workspace.file('frame_index.npz'), frame_names, np.stack(frame_signatures))
+
+        message = f"Frames extracted successfully. Total frames: {frame_number}"
     except Exception as e:
         message = f"Error: {str(e)}"
    
-    return render_template('download.html', message=message, video_filename=video_filename, frames_extracted=True, frames=frame_files, last_step='download')
+    return render_template('download.html', message=message, video_filename=video_filename, frames_extracted=True, frames=frame_files, workspace=workspace and workspace.id, last_step='download')
 
 @app.route('/remove_duplicates', methods=['POST'])
 def remove_duplicates():
+    workspace_id = request.form['workspace']
     try:
-        frames = sorted([f for f in os.listdir(FRAMES_DIRECTORY) if f.endswith('.jpg')])
+        workspace = open_workspace(workspace_id)
+        frames = list_frames(workspace)
+        frame_index_path = workspace.file('frame_index.npz')
        
         if not frames:
             return render_template('download.html', message="No frames found to process.", last_step='convert')
 
+        # Use the signature index from /convert; only sign frames from disk when it is missing
+        frame_signatures = None
+        if os.path.exists(frame_index_path):
+            frame_names, frame_signatures = load_hash_index(frame_index_path)
+        # An index of 64-bit hashes or whole thumbnails from before per-block signatures is signed again
+        if frame_signatures is None or frame_signatures.ndim != 4:
+            frame_names = frames
+            frame_signatures = np.stack([block_signature(cv2.imread(os.path.join(workspace.frames, f))) for f in frames])
+
+        keep = keep_mask(frame_signatures, BLOCK_THRESHOLD, block_distance)
         duplicates_removed = 0
-        last_frame = None
-
-        for frame in frames:
-            frame_path = os.path.join(FRAMES_DIRECTORY, frame)
-            current_frame = cv2.imread(frame_path)
-           
-            if last_frame is not None:
-                current_frame_resized = cv2.resize(current_frame, (last_frame.shape[1], last_frame.shape[0]))
-               
-                if cv2.norm(current_frame_resized, last_frame, cv2.NORM_L2) < 1.0:
-                    os.remove(frame_path)
-                    duplicates_removed += 1
-                else:
-                    last_frame = current_frame_resized
-            else:
-                last_frame = current_frame
+
+        for frame, kept in zip(frame_names, keep):
+            frame_path = os.path.join(workspace.frames, frame)
+            if not kept and os.path.exists(frame_path):
+                os.remove(frame_path)
+                duplicates_removed += 1
+
+        save_hash_index(frame_index_path, [name for name, kept in zip(frame_names, keep) if kept], frame_signatures[keep])
        
         message = f"Duplicates removed successfully. Total duplicates removed: {duplicates_removed}"
-        remaining_frames = sorted([f'frames/{f}' for f in os.listdir(FRAMES_DIRECTORY) if f.endswith('.jpg')])
+        remaining_frames = [static_path(os.path.join(workspace.frames, f)) for f in list_frames(workspace)]
     except Exception as e:
         message = f"Error: {str(e)}"
         remaining_frames = []
    
-    return render_template('download.html', message=message, duplicates_removed=True, frames=remaining_frames, last_step='convert')
+    return render_template('download.html', message=message, duplicates_removed=True, frames=remaining_frames, workspace=workspace_id, last_step='convert')
 
 @app.route('/stitch', methods=['POST'])
 def stitch():
+    workspace_id = request.form['workspace']
+    output_video_path = webm_output_path = ''
     try:
-        frames = sorted([f for f in os.listdir(FRAMES_DIRECTORY) if f.endswith('.jpg')])
+        workspace = open_workspace(workspace_id)
+        frames = list_frames(workspace)
        
         if not frames:
             return render_template('download.html', message="No frames found to process.", last_step='remove_duplicates')
 
-        create_directory(OUTPUT_VIDEO_DIRECTORY)
-       
-        frame_path = os.path.join(FRAMES_DIRECTORY, frames[0])
+        frame_path = os.path.join(workspace.frames, frames[0])
         frame = cv2.imread(frame_path)
         height, width, layers = frame.shape
         size = (width, height)
        
-        output_video_path = os.path.join(OUTPUT_VIDEO_DIRECTORY, 'stitched_video.mp4')
+        output_video_path = workspace.file('stitched_video.mp4')
         out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), 30, size)
        
         for frame_file in frames:
-            frame_path = os.path.join(FRAMES_DIRECTORY, frame_file)
+            frame_path = os.path.join(workspace.frames, frame_file)
             frame = cv2.imread(frame_path)
             out.write(frame)
        
         out.release()
+        workspace.charge(os.path.getsize(output_video_path))
 
         # Convert the stitched video to WebM format
-        webm_output_path = os.path.join(OUTPUT_VIDEO_DIRECTORY, 'stitched_video.webm')
+        webm_output_path = workspace.file('stitched_video.webm')
         convert_mp4_to_webm(output_video_path, webm_output_path)
+        workspace.charge(os.path.getsize(webm_output_path))
 
         message = f"Video created and converted successfully! <br> Output video path: {output_video_path} <br> WebM video path: {webm_output_path}"
     except Exception as e:
         message = f"Error: {str(e)}"
    
-    return render_template('download.html', message=message, stitched=True, output_video_path=f'output_videos/{os.path.basename(output_video_path)}', webm_video_path=f'output_videos/{os.path.basename(webm_output_path)}', last_step='remove_duplicates')
+    return render_template('download.html', message=message, stitched=True, output_video_path=output_video_path and static_path(output_video_path), webm_video_path=webm_output_path and static_path(webm_output_path), workspace=workspace_id, last_step='remove_duplicates')
 
 @app.route('/upload', methods=['POST'])
 def upload():
     try:
-        output_video_path = request.form['output_video_path']
+        output_video_path = open_workspace(request.form['workspace']).file('stitched_video.mp4')
         video_name = 'stitched_video'
        
         if not connect_str:
@@ -203,26 +224,28 @@ def upload():
         message = f"Error: {str(e)}"
         blob_url = None
    
-    return render_template('download.html', message=message, blob_url=blob_url, stitched=True, last_step='stitch')
+    return render_template('download.html', message=message, blob_url=blob_url, stitched=True, workspace=request.form.get('workspace'), last_step='stitch')
 
 @app.route('/frames')
 def view_frames():
-    frames = sorted([f for f in os.listdir(FRAMES_DIRECTORY) if f.endswith('.jpg')])
-    return render_template('frames.html', frames=frames)
+    workspace = open_workspace(request.args['workspace'])
+    frames = list_frames(workspace)
+    return render_template('frames.html', frames=frames, workspace=workspace.id)
 
 @app.route('/images')
 def images():
-    frames = sorted([f for f in os.listdir(FRAMES_DIRECTORY) if f.endswith('.jpg')])
+    workspace = open_workspace(request.args['workspace'])
+    frames = [static_path(os.path.join(workspace.frames, f)) for f in list_frames(workspace)]
     return jsonify(frames)
 
 @app.route('/play_video', methods=['GET'])
 def play_video():
-    webm_video_path = url_for('static', filename='output_videos/stitched_video.webm')
+    workspace = open_workspace(request.args['workspace'])
+    webm_video_path = url_for('static', filename=static_path(workspace.file('stitched_video.webm')))
     print(f"WebM video path: {webm_video_path}")  # Debugging line
     return render_template('video_play.html', video_path=webm_video_path)
 
 if __name__ == '__main__':
     create_directory(DOWNLOAD_DIRECTORY)
-    create_directory(FRAMES_DIRECTORY)
-    create_directory(OUTPUT_VIDEO_DIRECTORY)
+    create_directory(WORKSPACE_ROOT)
     app.run(debug=True)